@@ -0,0 +1,93 @@
+# Бенчмарк хранилища диалогов: задержки чтения и добавления реплик
+# при 100k сохранённых диалогов.
+# Запуск: python benchmarks/bench_conversation_store.py [число_диалогов]
+import asyncio
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gemini_bot.conversation_store import SCHEMA, ConversationStore
+
+TURNS_PER_CONVERSATION = 4
+
+
+def populate(path, conversations):
+    # Быстрое наполнение базы напрямую, минуя хранилище
+    connection = sqlite3.connect(path)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.executescript(SCHEMA)
+    now = time.time()
+    rows = (
+        (-1000 - i % 100, 0, i, "user" if turn % 2 == 0 else "assistant", "текст реплики " * 20, now)
+        for i in range(conversations)
+        for turn in range(TURNS_PER_CONVERSATION)
+    )
+    with connection:
+        connection.executemany(
+            "INSERT INTO messages (chat_id, thread_id, user_id, role, content, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            rows,
+        )
+    connection.close()
+
+
+def report(label, samples):
+    samples.sort()
+    p50 = samples[len(samples) // 2] * 1e6
+    p99 = samples[int(len(samples) * 0.99)] * 1e6
+    print(f"{label:<22} p50 {p50:8.1f} us   p99 {p99:8.1f} us")
+
+
+async def main():
+    conversations = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    samples_count = 2000
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "conversations.db")
+        started = time.perf_counter()
+        populate(path, conversations)
+        print(f"{conversations} диалогов записано за {time.perf_counter() - started:.1f} s")
+
+        store = ConversationStore(path, cache_size=samples_count // 2)
+        await store.open()
+        keys = [(-1000 - i % 100, 0, i) for i in random.sample(range(conversations), samples_count)]
+
+        cold = []
+        for key in keys:
+            t = time.perf_counter()
+            await store.get(key)
+            cold.append(time.perf_counter() - t)
+        report("read (cache miss)", cold)
+
+        hot_keys = keys[-samples_count // 2:]
+        hot = []
+        for key in hot_keys:
+            t = time.perf_counter()
+            await store.get(key)
+            hot.append(time.perf_counter() - t)
+        report("read (cache hit)", hot)
+
+        appends = []
+        for key in hot_keys:
+            history = await store.get(key)
+            t = time.perf_counter()
+            store.append(key, history, "user", "новый вопрос")
+            appends.append(time.perf_counter() - t)
+        report("append", appends)
+
+        t = time.perf_counter()
+        await store.flush()
+        print(f"{'flush ' + str(len(hot_keys)) + ' rows':<22} {(time.perf_counter() - t) * 1e3:.1f} ms")
+
+        t = time.perf_counter()
+        await store.clear(keys[0])
+        print(f"{'clear':<22} {(time.perf_counter() - t) * 1e6:.1f} us")
+        await store.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,218 @@
+# Бенчмарк и проверка свойств модуля formatting.
+# 1) Скорость форматирования ответов 4k–32k символов в сравнении
+#    со старым посимвольным циклом экранирования из main4.py.
+# 2) Случайные тексты из "опасных" кусочков разметки: результат всегда должен
+#    проходить правила сущностей Telegram (HTML и MarkdownV2) и сохранять текст.
+# Запуск: python benchmarks/bench_formatting.py [число_случайных_текстов]
+import html
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gemini_bot.formatting import to_html, to_markdown_v2
+
+SAMPLE = '''## **Как работает *args**
+Функция принимает **любое** число аргументов, а `*args` собирает их в кортеж.
+* первый пункт: 2*3 = 6
+* второй пункт <важно> & нужно
+```python
+def f(*args, **kwargs):
+    """Строка документации с **звёздочками**"""
+    return a < b and c > d
+```
+Ссылка [пример](https://example.com) и snake_case_name, код в строке ```print``` тоже.
+
+'''
+
+
+def old_escape(response):
+    # Цикл из main4.py до перехода на formatting
+    in_code_block = False
+    in_docstring = False
+    escaped_response = []
+    i = 0
+    while i < len(response):
+        char = response[i]
+        if (
+            i < len(response) - 2
+            and response[i] == '"'
+            and response[i + 1] == '"'
+            and response[i + 2] == '"'
+        ):
+            in_docstring = not in_docstring
+            escaped_response.append(char)
+            i += 3
+            continue
+        if char == '`':
+            in_code_block = not in_code_block
+        if char == '*' and not in_code_block and not in_docstring:
+            if i < len(response) - 1 and response[i + 1] == '*':
+                escaped_response.append('**')
+                i += 1
+            else:
+                escaped_response.append('\\*')
+        else:
+            escaped_response.append(char)
+        i += 1
+    return ''.join(escaped_response)
+
+
+HTML_TAG = re.compile(r'<(/?)(b|i|code|pre)( class="language-[\w+#-]+")?>')
+HTML_ENTITY = re.compile(r"&(lt|gt|amp|quot);")
+
+
+def check_html(text):
+    # Правила Telegram: только разрешённые теги, все теги закрыты и правильно вложены,
+    # внутри pre/code других тегов нет (кроме code с языком внутри pre), & и < экранированы
+    stack = []
+    i = 0
+    while i < len(text):
+        char = text[i]
+        if char == "<":
+            match = HTML_TAG.match(text, i)
+            assert match, f"bare '<' at {i}: {text!r}"
+            closing, tag, attrs = match.groups()
+            if closing:
+                assert stack and stack[-1] == tag, f"unbalanced </{tag}>: {text!r}"
+                stack.pop()
+            else:
+                if stack:
+                    assert stack == ["pre"] and tag == "code" and attrs, f"nested <{tag}>: {text!r}"
+                assert not attrs or tag == "code", f"attribute on <{tag}>: {text!r}"
+                stack.append(tag)
+            i = match.end()
+        elif char == "&":
+            assert HTML_ENTITY.match(text, i), f"bare '&' at {i}: {text!r}"
+            i += 1
+        else:
+            assert char != ">", f"bare '>' at {i}: {text!r}"
+            i += 1
+    assert not stack, f"unclosed {stack}: {text!r}"
+
+
+MD_SPECIAL = set("_*[]()~`>#+-=|{}.!\\")
+
+
+def check_markdown_v2(text):
+    # Правила Telegram: спецсимволы вне сущностей экранированы, сущности закрыты,
+    # внутри code/pre неэкранированными не бывают только ` и \
+    stack = []
+    i = 0
+    while i < len(text):
+        char = text[i]
+        top = stack[-1] if stack else None
+        if char == "\\":
+            assert i + 1 < len(text) and 0 < ord(text[i + 1]) < 127, f"bad escape at {i}: {text!r}"
+            i += 2
+        elif top == "pre":
+            if text.startswith("```", i):
+                stack.pop()
+                i += 3
+            else:
+                assert char != "`", f"lone '`' in pre at {i}: {text!r}"
+                i += 1
+        elif top == "code":
+            if char == "`":
+                stack.pop()
+            i += 1
+        elif char == "`":
+            if text.startswith("```", i):
+                stack.append("pre")
+                newline = text.find("\n", i)
+                assert newline != -1, f"pre without newline: {text!r}"
+                i = newline + 1
+            else:
+                stack.append("code")
+                i += 1
+        elif char in "*_":
+            entity = "bold" if char == "*" else "italic"
+            if top == entity:
+                stack.pop()
+            else:
+                assert entity not in stack, f"overlapping {entity} at {i}: {text!r}"
+                stack.append(entity)
+            i += 1
+        else:
+            assert char not in MD_SPECIAL, f"unescaped {char!r} at {i}: {text!r}"
+            i += 1
+    assert not stack, f"unclosed {stack}: {text!r}"
+
+
+WORD = re.compile(r"[^\W_]")
+# Строка информации после открывающего ``` (язык блока) — единственное, что можно не показать
+FENCE_INFO = re.compile(r"```[^\n`]*\n")
+
+
+def letters(text):
+    return "".join(WORD.findall(text))
+
+
+def is_subsequence(short, long):
+    rest = iter(long)
+    return all(char in rest for char in short)
+
+
+def check_text_kept(source, visible):
+    # Буквы и цифры ответа не теряются и не появляются из ниоткуда
+    kept, shown = letters(FENCE_INFO.sub("", source)), letters(visible)
+    assert is_subsequence(kept, shown), f"text lost: {source!r} -> {visible!r}"
+    assert is_subsequence(shown, letters(source)), f"text added: {source!r} -> {visible!r}"
+
+
+def html_visible(text):
+    return html.unescape(HTML_TAG.sub("", text))
+
+
+PIECES = [
+    "*", "**", "`", "```", "```python\n", "_", '"""', "#", "## ", "\n", "* ", "- ",
+    "<", ">", "&", "\\", "a", "текст", " ", ".", "!", "[", "]", "(", ")", "=", "|",
+    "{", "}", "~", "+", "😀",
+]
+
+
+def property_check(iterations):
+    rng = random.Random(0)
+    for _ in range(iterations):
+        text = "".join(rng.choice(PIECES) for _ in range(rng.randint(1, 60)))
+        check_formatted(text)
+    check_formatted(SAMPLE)
+    print(f"property check: {iterations} random texts OK")
+
+
+def check_formatted(text):
+    rendered = to_html(text)
+    check_html(rendered)
+    check_text_kept(text, html_visible(rendered))
+    rendered = to_markdown_v2(text)
+    check_markdown_v2(rendered)
+    check_text_kept(text, rendered)
+
+
+def bench(label, func, text, repeat=20):
+    best = min(_timed(func, text) for _ in range(repeat))
+    print(f"  {label:<12} {best * 1e3:7.2f} ms")
+
+
+def _timed(func, text):
+    started = time.perf_counter()
+    func(text)
+    return time.perf_counter() - started
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    property_check(iterations)
+    for size in (4096, 8192, 16384, 32768):
+        text = (SAMPLE * (size // len(SAMPLE) + 1))[:size]
+        print(f"{size} символов:")
+        bench("old loop", old_escape, text)
+        bench("html", to_html, text)
+        bench("markdown_v2", to_markdown_v2, text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+# Бенчмарк: N одновременных обращений к боту должны завершаться примерно
+# за время одного запроса к Gemini, а не за N таких времён.
+# Запуск: python benchmarks/bench_gemini_concurrency.py [N] [задержка_сек]
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gemini_bot.gemini_backend import GeminiBackend
+
+
+class FakeSyncModel:
+    # Имитирует google.generativeai.GenerativeModel без async API
+    def __init__(self, delay):
+        self.delay = delay
+
+    def generate_content(self, contents, **kwargs):
+        time.sleep(self.delay)
+        return contents
+
+
+class FakeAsyncModel(FakeSyncModel):
+    async def generate_content_async(self, contents, **kwargs):
+        await asyncio.sleep(self.delay)
+        return contents
+
+
+async def blocking_call(model, query):
+    # Как было раньше: синхронный вызов внутри async def
+    return model.generate_content(query)
+
+
+async def run(label, coros):
+    started = time.perf_counter()
+    await asyncio.gather(*coros)
+    elapsed = time.perf_counter() - started
+    print(f"{label:<28} {elapsed:6.2f} s")
+    return elapsed
+
+
+async def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    delay = float(sys.argv[2]) if len(sys.argv) > 2 else 0.5
+    print(f"{n} одновременных запросов, задержка Gemini {delay} s")
+
+    sync_model = FakeSyncModel(delay)
+    await run("blocking generate_content", [blocking_call(sync_model, i) for i in range(n)])
+
+    executor_backend = GeminiBackend(sync_model, max_concurrency=n, use_async=False)
+    await run("executor backend", [executor_backend.generate(i) for i in range(n)])
+    executor_backend.shutdown()
+
+    async_backend = GeminiBackend(FakeAsyncModel(delay), max_concurrency=n)
+    await run("async backend", [async_backend.generate(i) for i in range(n)])
+
+    limited = max(1, n // 2)
+    limited_backend = GeminiBackend(FakeAsyncModel(delay), max_concurrency=limited)
+    await run(f"async backend, limit={limited}", [limited_backend.generate(i) for i in range(n)])
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
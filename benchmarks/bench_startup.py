@@ -0,0 +1,175 @@
+# Бенчмарк холодного старта: медиана по нескольким запускам отдельных процессов.
+#  - импорт gemini_bot.bot и для сравнения импорт google.generativeai,
+#    который старые main*.py делали при старте;
+#  - python -m gemini_bot --check (импорт + сборка Application);
+#  - время до первого ответа: вопрос ждёт в fake Telegram ещё до запуска бота,
+#    как апдейт, пришедший во время перезапуска при деплое. С --drop-pending
+#    бот стартует с DROP_PENDING_UPDATES=1 и такой вопрос теряется.
+#    Здесь бот запускается с настройками по умолчанию, в том числе с сервером
+#    метрик (на свободном порту), и /metrics проверяется после ответа.
+# Без ответа на ожидавший вопрос скрипт завершается с ошибкой (smoke-тест в CI).
+# Запуск: python benchmarks/bench_startup.py [--runs 5] [--drop-pending]
+import argparse
+import asyncio
+import os
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from aiohttp import ClientSession
+
+from gemini_bot.fake_gemini import start_fake_gemini
+from gemini_bot.fake_telegram import BOT_USER, start_fake_telegram
+
+CHAT_ID = -1002030510187
+
+
+def bot_env(workdir, **extra):
+    env = dict(
+        os.environ,
+        TELEGRAM_BOT_TOKEN="123456:startup",
+        METRICS_PORT="0",
+        AUDIT_LOG_PATH=os.path.join(workdir, "audit.jsonl"),
+        TRACE_LOG_PATH=os.path.join(workdir, "traces.jsonl"),
+        CONVERSATION_DB=os.path.join(workdir, "conversations.db"),
+        GEMINI_API_KEYS="startup-key",
+        GEMINI_STREAMING="0",
+    )
+    env.update(extra)
+    return env
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def scrape_metrics(port):
+    try:
+        async with ClientSession() as session:
+            async with session.get(f"http://127.0.0.1:{port}/metrics") as response:
+                text = await response.text()
+                return response.status == 200 and "bot_updates_received_total" in text
+    except OSError:
+        return False
+
+
+def timed_run(command, env):
+    started = time.perf_counter()
+    subprocess.run(command, cwd=ROOT, env=env, check=True, stdout=subprocess.DEVNULL)
+    return time.perf_counter() - started
+
+
+def question():
+    mention = "@" + BOT_USER["username"]
+    return {
+        "message": {
+            "message_id": 1,
+            "date": int(time.time()),
+            "chat": {"id": CHAT_ID, "type": "supergroup", "title": "startup"},
+            "from": {"id": 1000, "is_bot": False, "first_name": "user"},
+            "text": f"{mention} вопрос, заданный во время перезапуска",
+            "entities": [{"type": "mention", "offset": 0, "length": len(mention)}],
+        }
+    }
+
+
+async def first_reply(workdir, drop_pending, timeout):
+    # Секунды от запуска процесса до ответа на ожидавший вопрос (None — ответа нет)
+    # и отдаёт ли бот /metrics
+    fake_telegram, telegram_runner, telegram_url = await start_fake_telegram(latency=0.01)
+    fake_gemini, gemini_runner, gemini_url = await start_fake_gemini(latency=0.05)
+    fake_telegram.push_update(question())
+    env = bot_env(
+        workdir,
+        TELEGRAM_API_URL=telegram_url,
+        GEMINI_ENDPOINT=gemini_url,
+        DROP_PENDING_UPDATES="1" if drop_pending else "0",
+        METRICS_PORT=str(free_port()),
+    )
+
+    started = time.perf_counter()
+    process = await asyncio.create_subprocess_exec(
+        sys.executable, "-m", "gemini_bot", cwd=ROOT, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    elapsed = None
+    deadline = started + timeout
+    while time.perf_counter() < deadline and process.returncode is None:
+        # Сам ответ, а не "думаю..."
+        if any("думаю" not in text for text in fake_telegram.texts):
+            elapsed = time.perf_counter() - started
+            break
+        await asyncio.sleep(0.005)
+    metrics_ok = process.returncode is None and await scrape_metrics(env["METRICS_PORT"])
+
+    if process.returncode is None:
+        process.send_signal(signal.SIGINT)
+        try:
+            await asyncio.wait_for(process.wait(), 10)
+        except asyncio.TimeoutError:
+            process.kill()
+            await process.wait()
+    await telegram_runner.cleanup()
+    await gemini_runner.cleanup()
+    return elapsed, metrics_ok
+
+
+def report(name, values):
+    if not values:
+        print(f"{name:<42} нет данных")
+        return
+    print(
+        f"{name:<42} median {statistics.median(values):6.3f} s"
+        f"   min {min(values):6.3f} s   max {max(values):6.3f} s"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold start benchmark")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--timeout", type=float, default=30, help="seconds to wait for a reply")
+    parser.add_argument(
+        "--drop-pending", action="store_true", help="start with DROP_PENDING_UPDATES=1"
+    )
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="startup-")
+    env = bot_env(workdir)
+    python = sys.executable
+    report(
+        "import google.generativeai (старый старт)",
+        [timed_run([python, "-c", "import google.generativeai"], env) for _ in range(args.runs)],
+    )
+    report(
+        "import gemini_bot.bot",
+        [timed_run([python, "-c", "import gemini_bot.bot"], env) for _ in range(args.runs)],
+    )
+    report(
+        "python -m gemini_bot --check",
+        [timed_run([python, "-m", "gemini_bot", "--check"], env) for _ in range(args.runs)],
+    )
+
+    runs = [
+        asyncio.run(first_reply(workdir, args.drop_pending, args.timeout))
+        for _ in range(args.runs)
+    ]
+    answered = [elapsed for elapsed, _ in runs if elapsed is not None]
+    metrics_ok = sum(ok for _, ok in runs)
+    report("первый ответ после запуска", answered)
+    print(f"Ответов на вопрос, ждавший перезапуска: {len(answered)} из {len(runs)}")
+    print(f"/metrics отвечает: {metrics_ok} из {len(runs)}")
+    if not args.drop_pending and (len(answered) < len(runs) or metrics_ok < len(runs)):
+        sys.exit("Бот не стартовал с настройками по умолчанию")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+# Нагрузочный тест приёма вебхуков: синтетические апдейты отправляются
+# на локальный aiohttp-сервер, измеряется пропускная способность и задержка ответа.
+# Запуск: python benchmarks/bench_webhook.py [число_апдейтов] [параллельность]
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aiohttp import ClientSession, web
+from telegram.ext import ApplicationBuilder
+
+from gemini_bot.webhook import SECRET_HEADER, build_webhook_app
+
+SECRET = "bench-secret"
+
+
+def synthetic_update(update_id):
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": -1002030510187 - update_id % 50, "type": "supergroup", "title": "bench"},
+            "from": {"id": 1000 + update_id % 500, "is_bot": False, "first_name": "user"},
+            "text": f"@bench_bot вопрос номер {update_id}",
+            "entities": [{"type": "mention", "offset": 0, "length": 10}],
+        },
+    }
+
+
+async def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+
+    application = ApplicationBuilder().token("123456:bench").build()
+    runner = web.AppRunner(build_webhook_app(application, secret_token=SECRET))
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    url = f"http://127.0.0.1:{port}/telegram"
+
+    latencies = []
+    ids = iter(range(total))
+
+    async def client(session):
+        for update_id in ids:
+            started = time.perf_counter()
+            async with session.post(
+                url, json=synthetic_update(update_id), headers={SECRET_HEADER: SECRET}
+            ) as response:
+                assert response.status == 200, response.status
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    async with ClientSession() as session:
+        await asyncio.gather(*[client(session) for _ in range(concurrency)])
+    elapsed = time.perf_counter() - started
+
+    async with ClientSession() as session:
+        async with session.post(url, json=synthetic_update(0)) as response:
+            rejected = response.status
+
+    latencies.sort()
+    print(f"{total} апдейтов, параллельность {concurrency}: {total / elapsed:.0f} upd/s")
+    print(
+        f"latency p50 {latencies[len(latencies) // 2] * 1e3:.2f} ms, "
+        f"p99 {latencies[int(len(latencies) * 0.99)] * 1e3:.2f} ms"
+    )
+    print(f"в очереди приложения: {application.update_queue.qsize()}, без секрета: HTTP {rejected}")
+    await runner.cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
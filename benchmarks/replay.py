@@ -0,0 +1,276 @@
+# Воспроизведение записанных апдейтов через те же Application и хендлеры, что в gemini_bot/bot.py,
+# против встроенных fake Bot API (fake_telegram.py) и fake Gemini (fake_gemini.py).
+# --variant выбирает вариант настроек бота, как python -m gemini_bot --variant.
+# Строка входного JSONL — либо Telegram Update целиком, либо объект с текстом вопроса
+# (поле --text-field, например body в requests.jsonl): из него собирается обращение к боту.
+# Отчёт: пропускная способность, p50/p95/p99 от постановки апдейта до конца обработки
+# и разбивка по стадиям из метрик (metrics.py).
+# Запуск: python benchmarks/replay.py requests.jsonl --rate 50 --concurrency 100
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+from collections import defaultdict, deque
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from telegram import Update
+
+from gemini_bot.fake_gemini import start_fake_gemini
+from gemini_bot.fake_telegram import start_fake_telegram
+from gemini_bot.variants import VARIANTS, apply_variant
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def load_updates(path, text_field, count, chat_ids, mention, threads):
+    # Записанные апдейты идут как есть, текстовые запросы превращаются в @упоминание бота
+    records = []
+    if path:
+        with open(path, encoding="utf-8") as source:
+            records = [json.loads(line) for line in source if line.strip()]
+    if not records:
+        records = [{text_field: f"Расскажи что-нибудь интересное, вариант {i}"} for i in range(count)]
+    if count:
+        records = (records * (count // len(records) + 1))[:count]
+
+    updates = []
+    for index, record in enumerate(records, start=1):
+        if "update_id" in record:
+            record = dict(record, update_id=index)
+        else:
+            # Номер в конце делает вопросы разными, чтобы не отвечать из кеша ответов
+            text = f"{mention} {record[text_field]} #{index}"
+            record = {
+                "update_id": index,
+                "message": {
+                    "message_id": index,
+                    "date": int(time.time()),
+                    "chat": {
+                        "id": chat_ids[index % len(chat_ids)],
+                        "type": "supergroup",
+                        "title": "replay",
+                        "is_forum": True,
+                    },
+                    "message_thread_id": 1 + index % threads,
+                    "is_topic_message": True,
+                    "from": {"id": 1000 + index % 1000, "is_bot": False, "first_name": "user"},
+                    "text": text,
+                    "entities": [{"type": "mention", "offset": 0, "length": len(mention)}],
+                },
+            }
+        updates.append(record)
+    return updates
+
+
+def histogram_summary(histogram):
+    # Сумма по всем меткам: число наблюдений и среднее, секунды
+    count = total = 0
+    for counts, seconds in histogram.values.values():
+        count += sum(counts)
+        total += seconds
+    return count, (total / count if count else 0.0)
+
+
+def configure(args, workdir, telegram_url, gemini_url):
+    # Настройки бота задаются окружением до импорта gemini_bot.bot
+    os.environ.update(
+        TELEGRAM_BOT_TOKEN="123456:replay",
+        TELEGRAM_API_URL=telegram_url,
+        GEMINI_ENDPOINT=gemini_url,
+        GEMINI_API_KEYS="replay-key",
+        GEMINI_STREAMING="1" if args.streaming else "0",
+        STREAM_EDIT_INTERVAL=str(args.edit_interval),
+        METRICS_PORT="0",
+        AUDIT_LOG_PATH=os.path.join(workdir, "audit.jsonl"),
+        TRACE_LOG_PATH=os.path.join(workdir, "traces.jsonl"),
+        TRACE_SAMPLE_RATE="1",
+        CONVERSATION_DB=os.path.join(workdir, "conversations.db"),
+        DISPATCH_QUEUE_DEPTH=str(max(20, args.concurrency)),
+        GEMINI_MAX_CONCURRENCY=str(args.concurrency),
+    )
+    apply_variant(args.variant)
+    # Лимиты пользователей и чатов выключены: все апдейты идут от нескольких чатов
+    for name in ("RATE_USER", "RATE_CHAT", "RATE_GLOBAL"):
+        os.environ[f"{name}_PER_MIN"] = "1000000"
+        os.environ[f"{name}_BURST"] = "1000000"
+    if not args.telegram_limits:
+        os.environ["TELEGRAM_GLOBAL_PER_SEC"] = "1000000"
+        os.environ["TELEGRAM_GROUP_PER_MIN"] = "1000000"
+
+
+async def run(args):
+    fake_telegram, telegram_runner, telegram_url = await start_fake_telegram(
+        latency=args.telegram_latency,
+        jitter=args.telegram_jitter,
+        error_rate=args.telegram_error_rate,
+        flood_rate=args.telegram_flood_rate,
+    )
+    fake_gemini, gemini_runner, gemini_url = await start_fake_gemini(
+        latency=args.gemini_latency,
+        jitter=args.gemini_jitter,
+        chunks=args.chunks,
+        error_rate=args.gemini_error_rate,
+        throttle_rate=args.gemini_throttle_rate,
+    )
+    workdir = tempfile.mkdtemp(prefix="replay-")
+    configure(args, workdir, telegram_url, gemini_url)
+
+    from gemini_bot import bot
+
+    logging.getLogger().setLevel(logging.WARNING)
+    # Пул соединений REST-клиента Gemini меньше числа потоков — предупреждения не важны
+    logging.getLogger("urllib3").setLevel(logging.ERROR)
+
+    # Конец обработки апдейта фиксируется обёрткой вокруг тех же хендлеров
+    started_at, finished = {}, {}
+    slots = asyncio.Semaphore(args.concurrency)
+    all_done = asyncio.Event()
+    expected = 0
+
+    def track(callback):
+        async def tracked(update, context):
+            try:
+                await callback(update, context)
+            finally:
+                finished[update.update_id] = time.perf_counter()
+                slots.release()
+                if len(finished) == expected:
+                    all_done.set()
+
+        return tracked
+
+    bot.handle_message = track(bot.handle_message)
+    bot.start = track(bot.start)
+    bot.clear = track(bot.clear)
+
+    application = bot.build_application()
+    await application.initialize()
+    await application.post_init(application)
+    await application.start()
+
+    records = load_updates(
+        args.updates,
+        args.text_field,
+        args.count,
+        # Вариант без списка чатов (ALLOWED_CHAT_IDS=*) отвечает в любом чате
+        sorted(bot.ALLOWED_GROUP_CHAT_IDS or {-1002030510187}),
+        f"@{application.bot.username}",
+        args.threads,
+    )
+    updates = [Update.de_json(data, application.bot) for data in records]
+    bot.tracer.recent = deque(maxlen=len(updates))
+    # Апдейты, которые не дойдут до хендлеров, сразу считаются отфильтрованными
+    handled = [
+        update for update in updates
+        if any(handler.check_update(update) for handler in application.handlers[0])
+    ]
+    expected = len(handled)
+    filtered = len(updates) - expected
+
+    begin = time.perf_counter()
+    for index, update in enumerate(handled):
+        if args.rate:
+            delay = begin + index / args.rate - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        await slots.acquire()
+        started_at[update.update_id] = time.perf_counter()
+        await application.update_queue.put(update)
+    if expected:
+        try:
+            await asyncio.wait_for(all_done.wait(), args.timeout)
+        except asyncio.TimeoutError:
+            print(f"Таймаут: обработано {len(finished)} из {expected}")
+    elapsed = time.perf_counter() - begin
+
+    latencies = [finished[key] - started_at[key] for key in finished if key in started_at]
+    outbox_stats = bot.outbox.stats()
+    await application.stop()
+    await application.shutdown()
+    await application.post_shutdown(application)
+    await telegram_runner.cleanup()
+    await gemini_runner.cleanup()
+
+    print(f"Апдейтов: {len(updates)}, обработано: {len(latencies)}, отфильтровано: {filtered}")
+    print(f"Время: {elapsed:.2f} s, пропускная способность: {len(latencies) / elapsed:.1f} upd/s")
+    print(
+        f"Сквозная задержка: p50 {percentile(latencies, 0.5) * 1000:.0f} ms, "
+        f"p95 {percentile(latencies, 0.95) * 1000:.0f} ms, "
+        f"p99 {percentile(latencies, 0.99) * 1000:.0f} ms"
+    )
+    print("Стадии (число, среднее):")
+    stages = [
+        ("обработка вопроса", bot.HANDLE_SECONDS),
+        ("запрос к Gemini", bot.registry.metrics["gemini_request_seconds"]),
+        ("вызов Bot API", bot.registry.metrics["telegram_send_seconds"]),
+        ("рендер разметки", bot.RENDER_SECONDS),
+    ]
+    for name, histogram in stages:
+        count, mean = histogram_summary(histogram)
+        print(f"  {name:<20} {count:>7} {mean * 1000:>9.1f} ms")
+    spans = defaultdict(list)
+    for trace in bot.tracer.recent:
+        for item in trace["spans"]:
+            spans[item["name"]].append(item["ms"])
+    for name, values in spans.items():
+        print(
+            f"  span {name:<15} {len(values):>7} {sum(values) / len(values):>9.1f} ms"
+            f"   p95 {percentile(values, 0.95):.1f} ms"
+        )
+    handle_count, handle_mean = histogram_summary(bot.HANDLE_SECONDS)
+    if latencies and handle_count:
+        queued = sum(latencies) / len(latencies) - handle_mean
+        print(f"  {'очередь чата':<20} {len(latencies):>7} {queued * 1000:>9.1f} ms")
+    print(
+        f"  {'ожидание в outbox':<20} p50 {outbox_stats['wait_p50'] * 1000:.1f} ms, "
+        f"p95 {outbox_stats['wait_p95'] * 1000:.1f} ms"
+    )
+    print(f"Вызовы Bot API: {dict(fake_telegram.calls)}, сбои: {dict(fake_telegram.injected)}")
+    print(f"Записано в аудит: {bot.audit_log.written}, трасс: {bot.trace_log.written}")
+    print(
+        f"Запросы к Gemini: {sum(fake_gemini.requests.values())}, "
+        f"429: {sum(fake_gemini.rejected.values())}, сбои: {dict(fake_gemini.injected)}"
+    )
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Replay updates against fake Telegram and Gemini")
+    parser.add_argument("updates", nargs="?", help="JSONL: Telegram updates or objects with question text")
+    parser.add_argument("--variant", default="main", choices=list(VARIANTS), help="bot settings preset")
+    parser.add_argument("--text-field", default="body", help="question field for non-update lines")
+    parser.add_argument("--count", type=int, default=0, help="number of updates (repeats input, 0 — as is)")
+    parser.add_argument("--rate", type=float, default=0, help="updates per second (0 — as fast as possible)")
+    parser.add_argument("--concurrency", type=int, default=50, help="max updates in flight")
+    parser.add_argument("--threads", type=int, default=100, help="forum topics for synthetic updates")
+    parser.add_argument("--telegram-latency", type=float, default=0.05)
+    parser.add_argument("--telegram-jitter", type=float, default=0.3, help="lognormal sigma")
+    parser.add_argument("--gemini-latency", type=float, default=0.8)
+    parser.add_argument("--gemini-jitter", type=float, default=0.5, help="lognormal sigma")
+    parser.add_argument("--telegram-error-rate", type=float, default=0.0, help="share of 500s")
+    parser.add_argument("--telegram-flood-rate", type=float, default=0.0, help="share of 429s")
+    parser.add_argument("--gemini-error-rate", type=float, default=0.0, help="share of 503s")
+    parser.add_argument("--gemini-throttle-rate", type=float, default=0.0, help="share of 429s")
+    parser.add_argument("--chunks", type=int, default=4, help="chunks per streamed answer")
+    parser.add_argument("--no-streaming", dest="streaming", action="store_false")
+    parser.add_argument("--edit-interval", type=float, default=0.5)
+    parser.add_argument("--telegram-limits", action="store_true", help="keep Telegram flood limits")
+    parser.add_argument("--timeout", type=float, default=300)
+    args = parser.parse_args()
+    if not args.updates and not args.count:
+        args.count = 500
+    return args
+
+
+if __name__ == "__main__":
+    asyncio.run(run(parse_args()))
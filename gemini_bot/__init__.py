@@ -0,0 +1 @@
+# Telegram-бот для Gemini. Точка входа — cli.py: python -m gemini_bot
@@ -0,0 +1,163 @@
+# Аудит запросов к боту: компактные JSON-записи (id, модель, токены, задержки,
+# обрезанный текст) пишутся в ротируемые JSONL-файлы.
+# Хендлер только кладёт запись в очередь; фоновая задача сбрасывает записи пачками,
+# запись на диск идёт в отдельном потоке и не задерживает event loop.
+# Успешные запросы можно сэмплировать, ошибки пишутся всегда.
+import asyncio
+import json
+import logging
+import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# Сигнал остановки фоновой задаче: встаёт в очередь после уже принятых записей
+_STOP = object()
+
+
+def truncate(text, limit):
+    if text is None or limit <= 0:
+        return None
+    return text if len(text) <= limit else text[:limit] + "…"
+
+
+class AuditLog:
+    def __init__(
+        self,
+        path="logs/audit.jsonl",
+        sample_rate=1.0,
+        max_text=200,
+        max_bytes=10 * 1024 * 1024,
+        backups=5,
+        batch_size=200,
+        flush_interval=1.0,
+        max_queue=10000,
+    ):
+        self.path = path
+        self.sample_rate = sample_rate
+        self.max_text = max_text
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self.written = 0
+        self.dropped = 0
+        self.sampled_out = 0
+        self._queue = None
+        self._task = None
+        self._executor = None
+        self._file = None
+
+    def record(self, **fields):
+        # Вызывается из хендлеров: только сэмплирование и put_nowait
+        if self._queue is None:
+            return
+        if "error" not in fields and random.random() >= self.sample_rate:
+            self.sampled_out += 1
+            return
+        fields["ts"] = round(time.time(), 3)
+        for name in ("query", "response"):
+            if name in fields:
+                fields[name] = truncate(fields[name], self.max_text)
+        try:
+            self._queue.put_nowait(fields)
+        except asyncio.QueueFull:
+            # Диск не успевает — теряем аудит, а не память и не задержку ответа
+            self.dropped += 1
+
+    async def start(self):
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="audit")
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        # Не cancel(): задача держит набранную пачку в памяти, она дописывается до выхода
+        await self._queue.put(_STOP)
+        await self._task
+        # Записи, пришедшие после сигнала остановки, дописываем здесь
+        batch = []
+        while not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        if batch:
+            await self._write(batch)
+        await asyncio.get_running_loop().run_in_executor(self._executor, self._close_file)
+        self._executor.shutdown(wait=True)
+        self._task = None
+        self._queue = None
+
+    async def _run(self):
+        stopping = False
+        while not stopping:
+            item = await self._queue.get()
+            if item is _STOP:
+                return
+            batch = [item]
+            # Даём пачке набраться, но не дольше flush_interval
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            await self._write(batch)
+
+    async def _write(self, batch):
+        data = "".join(
+            json.dumps(record, ensure_ascii=False, default=str) + "\n" for record in batch
+        ).encode()
+        try:
+            await asyncio.get_running_loop().run_in_executor(self._executor, self._append, data)
+        except OSError as e:
+            self.dropped += len(batch)
+            logger.error(f"Failed to write audit log {self.path}: {e}")
+        else:
+            self.written += len(batch)
+
+    def _append(self, data):
+        if self._file is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._file = open(self.path, "ab")
+        if self._file.tell() and self._file.tell() + len(data) > self.max_bytes:
+            self._rotate()
+        self._file.write(data)
+        self._file.flush()
+
+    def _rotate(self):
+        # audit.jsonl -> audit.jsonl.1 -> ... -> audit.jsonl.<backups>, самый старый удаляется
+        self._close_file()
+        for index in range(self.backups - 1, 0, -1):
+            source = f"{self.path}.{index}"
+            if os.path.exists(source):
+                os.replace(source, f"{self.path}.{index + 1}")
+        if self.backups:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self._file = open(self.path, "ab")
+
+    def _close_file(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def stats(self):
+        return {
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "written": self.written,
+            "dropped": self.dropped,
+            "sampled_out": self.sampled_out,
+        }
@@ -0,0 +1,756 @@
+# рабочий файл с логами в память с условием работы только в телеграм группе, 
+# с прописанным промтом и выставленными настройками для Gemini.
+# Запуск — через cli.py (python -m gemini_bot); прежние main0–main5.py стали вариантами
+# настроек (см. variants.py). SDK Gemini при импорте не загружается: модели создаются
+# при первом запросе, так что модуль импортируется быстро.
+import logging
+import math
+import os
+import re
+import time
+from telegram import Update
+from telegram.ext import (
+    ApplicationBuilder,
+    ContextTypes,
+    MessageHandler,
+    CommandHandler,
+    TypeHandler,
+    filters,
+)
+from telegram.constants import ParseMode
+from .gemini_backend import GeminiBackend
+from .key_pool import KeyPool
+from .resilience import ResilientGemini, CircuitBreaker
+from .model_router import ModelRouter, Tier
+from .streaming import stream_to_message
+from .chat_dispatcher import ChatDispatcher
+from .bot_filters import AddressedToBot
+from .conversation_store import ConversationStore, conversation_key, topic_id
+from .response_cache import ResponseCache
+from .singleflight import SingleFlight, request_key
+from .rate_limit import RateLimiter
+from .formatting import format_reply
+from .delivery import send_reply
+from .outbox import Outbox, PLACEHOLDER
+from .token_estimator import estimator as token_estimator
+from .metrics import registry, start_metrics_server
+from .audit_log import AuditLog
+from .tracing import Tracer, span
+
+# Настройка логирования
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Настройка бота
+BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
+# Другой адрес Bot API, например локальный fake_telegram.py (http://127.0.0.1:8082/bot)
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL")
+
+# Типы апдейтов, которые бот получает от Telegram
+ALLOWED_UPDATES = os.getenv("ALLOWED_UPDATES", "message").split(",")
+
+# Отбрасывать ли накопившиеся апдейты при старте. По умолчанию нет: при перезапуске
+# во время деплоя вопросы, пришедшие за время простоя, иначе теряются
+DROP_PENDING_UPDATES = os.getenv("DROP_PENDING_UPDATES", "0") == "1"
+
+# Режим вебхука: если задан WEBHOOK_URL, вместо run_polling поднимается aiohttp-сервер
+WEBHOOK_URL = os.getenv("WEBHOOK_URL")
+WEBHOOK_LISTEN = os.getenv("WEBHOOK_LISTEN", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8080"))
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/telegram")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")
+
+# Число рабочих процессов (1 — всё в одном процессе).
+# SHARD_COUNT выставляет супервизор: общие лимиты делятся между процессами
+WORKERS = int(os.getenv("WORKERS", "1"))
+SHARD_COUNT = int(os.getenv("SHARD_COUNT", "1"))
+
+# Метрики Prometheus на http://METRICS_HOST:METRICS_PORT/metrics (0 — выключены);
+# рабочий процесс N слушает METRICS_PORT + N
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9090"))
+metrics_runner = None
+
+UPDATES_RECEIVED = registry.counter("bot_updates_received_total", "Updates received")
+UPDATES_ANSWERED = registry.counter("bot_updates_answered_total", "Questions answered")
+UPDATES_REJECTED = registry.counter(
+    "bot_updates_rejected_total", "Questions rejected before Gemini", ["reason"]
+)
+HANDLER_ERRORS = registry.counter("bot_errors_total", "Handler errors by type", ["type"])
+HANDLE_SECONDS = registry.histogram("bot_handle_seconds", "Question handling time, end to end")
+RENDER_SECONDS = registry.histogram(
+    "reply_render_seconds", "Markdown to Telegram markup conversion time"
+)
+
+# Аудит запросов в ротируемые JSONL-файлы (в рабочем процессе N — audit-N.jsonl).
+# AUDIT_SAMPLE_RATE — доля успешных запросов в аудите, ошибки пишутся всегда;
+# AUDIT_MAX_TEXT — сколько символов вопроса и ответа сохранять (0 — без текста)
+AUDIT_LOG_PATH = os.getenv("AUDIT_LOG_PATH", "logs/audit.jsonl")
+audit_log = AuditLog(
+    AUDIT_LOG_PATH,
+    sample_rate=float(os.getenv("AUDIT_SAMPLE_RATE", "1.0")),
+    max_text=int(os.getenv("AUDIT_MAX_TEXT", "200")),
+    max_bytes=int(os.getenv("AUDIT_MAX_BYTES", str(10 * 1024 * 1024))),
+    backups=int(os.getenv("AUDIT_BACKUPS", "5")),
+)
+
+# Трассы обработки апдейтов (стадии handle_message) в logs/traces.jsonl:
+# доля TRACE_SAMPLE_RATE всех апдейтов и все, что дольше TRACE_SLOW_SECONDS
+TRACE_LOG_PATH = os.getenv("TRACE_LOG_PATH", "logs/traces.jsonl")
+trace_log = AuditLog(TRACE_LOG_PATH, max_text=0)
+tracer = Tracer(
+    trace_log,
+    sample_rate=float(os.getenv("TRACE_SAMPLE_RATE", "0.01")),
+    slow_seconds=float(os.getenv("TRACE_SLOW_SECONDS", "10")),
+)
+
+# Администраторы (id пользователей через запятую) могут запускать /profile
+ADMIN_USER_IDS = {
+    int(user_id) for user_id in os.getenv("ADMIN_USER_IDS", "").split(",") if user_id.strip()
+}
+PROFILE_MAX_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", "60"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "logs")
+
+# ID групповых чатов через запятую; "*" — любой чат
+ALLOWED_CHAT_IDS = os.getenv("ALLOWED_CHAT_IDS", "-1002030510187,-1002030599999")
+ALLOWED_GROUP_CHAT_IDS = (
+    None
+    if ALLOWED_CHAT_IDS.strip() == "*"
+    else {int(chat_id) for chat_id in ALLOWED_CHAT_IDS.split(",") if chat_id.strip()}
+)
+
+# ANSWER_ALL=1 — отвечать на любое текстовое сообщение, а не только на обращения к боту
+ANSWER_ALL = os.getenv("ANSWER_ALL", "0") == "1"
+
+# Фильтр обращений к боту; данные бота подставляются при старте в on_startup
+addressed_to_bot = AddressedToBot(ALLOWED_GROUP_CHAT_IDS, require_address=not ANSWER_ALL)
+
+# API-ключи Gemini: несколько через запятую в GEMINI_API_KEYS или один в GEMINI_API_KEY
+GEMINI_API_KEYS = [
+    key.strip()
+    for key in os.getenv("GEMINI_API_KEYS", os.getenv("GEMINI_API_KEY", "")).split(",")
+    if key.strip()
+]
+# Другой адрес Gemini API, например локальный fake_gemini.py (http://127.0.0.1:8081)
+GEMINI_ENDPOINT = os.getenv("GEMINI_ENDPOINT")
+
+# Установка модели Gemini
+generation_config = {
+    "temperature": 0.5,
+    "top_p": 0.95,
+    "top_k": 64,
+    "max_output_tokens": 4090,
+}
+
+# Системная инструкция для Gemini (промт): передаётся модели как system_instruction.
+# PERSONA=0 — без персоны
+system_instruction = """Ты -  девушка по имени Ника,так звали греческую богиню. Ты - хороший, грамотный специалист по программированию. Много знаешь во всех областях наук и естествознаний. Пользуешься интернет поиском. 
+                        Ты всё обясняешь для человека с нулевыми знаниями. Ты имеешь доступ к страницам интернета. В обяснении опираешься на ссылки материалов из интернета. Если тебе указывают ссылку на интернет страницу - ознакамливаешься
+                        и изучаешь контекст этой страницк и ссылки на ней. 
+                        Используешь легкий флирт в общении. """
+if os.getenv("PERSONA", "1") != "1":
+    system_instruction = ""
+
+# Кеш контекста Gemini для персоны, секунды жизни (0 — выключен). API кеширует
+# только большой контекст (от 32768 токенов), для короткой персоны кеш не создаётся
+GEMINI_CACHE_TTL = int(os.getenv("GEMINI_CACHE_TTL", "0"))
+
+# Бюджет токенов на весь запрос (персона + история + вопрос); проверяется локально,
+# без count_tokens: старые реплики подрезаются, слишком длинный вопрос отклоняется
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "16000"))
+
+
+def calibrate_tokens(contents, usage):
+    # Локальная оценка запроса против настоящего prompt_token_count из ответа Gemini
+    token_estimator.calibrate(
+        token_estimator.contents_raw(contents, system_instruction), usage.prompt_token_count
+    )
+
+
+# Модели от дешёвой и быстрой к сильной; роутер выбирает модель на каждый запрос
+GEMINI_MODELS = [
+    name.strip()
+    for name in os.getenv("GEMINI_MODELS", "gemini-1.5-flash,gemini-1.5-pro").split(",")
+    if name.strip()
+]
+
+# Максимум одновременных запросов к каждой модели, остальные ждут в очереди
+GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", "8"))
+
+
+def build_tier(model_name):
+    # Пул ключей ведёт себя как модель: запрос уходит на наименее загруженный ключ,
+    # ключ с исчерпанной квотой (429) временно исключается
+    model = KeyPool.from_keys(
+        model_name,
+        GEMINI_API_KEYS or [None],
+        endpoint=GEMINI_ENDPOINT,
+        system_instruction=system_instruction or None,
+        cache_ttl=GEMINI_CACHE_TTL,
+        strategy=os.getenv("GEMINI_KEY_STRATEGY", "least_loaded"),
+    )
+    # Сторонний endpoint доступен только через синхронный REST-клиент
+    backend = GeminiBackend(
+        model,
+        max_concurrency=GEMINI_MAX_CONCURRENCY,
+        use_async=not GEMINI_ENDPOINT,
+        on_usage=calibrate_tokens,
+    )
+    # Повторы временных ошибок в пределах GEMINI_DEADLINE секунд; после
+    # GEMINI_BREAKER_THRESHOLD сбоев подряд запросы к модели приостанавливаются.
+    # GEMINI_HEDGE=1 дублирует запрос (поток — до первого чанка), не ответивший за p95
+    # (вдвое больше квоты на хвосте)
+    gemini = ResilientGemini(
+        backend,
+        max_attempts=int(os.getenv("GEMINI_MAX_ATTEMPTS", "3")),
+        deadline=float(os.getenv("GEMINI_DEADLINE", "60")),
+        breaker=CircuitBreaker(
+            failure_threshold=int(os.getenv("GEMINI_BREAKER_THRESHOLD", "5")),
+            recovery_timeout=float(os.getenv("GEMINI_BREAKER_TIMEOUT", "30")),
+        ),
+        hedge=os.getenv("GEMINI_HEDGE", "0") == "1",
+    )
+    return Tier(model.model_name, gemini)
+
+
+# Код, длинный вопрос или длинная история — на сильную модель, остальное — на быструю
+router = ModelRouter(
+    [build_tier(name) for name in GEMINI_MODELS],
+    heavy_chars=int(os.getenv("ROUTER_HEAVY_CHARS", "1500")),
+    heavy_history_tokens=int(os.getenv("ROUTER_HEAVY_HISTORY_TOKENS", "4000")),
+    max_error_rate=float(os.getenv("ROUTER_MAX_ERROR_RATE", "0.3")),
+    max_latency=float(os.getenv("ROUTER_MAX_LATENCY", "20")),
+)
+
+# Бюджет токенов на окно истории диалога (без системной инструкции)
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "8000"))
+
+# История диалогов хранится в SQLite, горячие диалоги — в LRU-кеше
+conversations = ConversationStore(
+    os.getenv("CONVERSATION_DB", "data/conversations.db"),
+    cache_size=int(os.getenv("CONVERSATION_CACHE_SIZE", "1024")),
+    token_budget=HISTORY_TOKEN_BUDGET,
+)
+
+# Кеш ответов на вопросы без истории диалога
+response_cache = ResponseCache(
+    ttl=int(os.getenv("RESPONSE_CACHE_TTL", "3600")),
+    max_entries=int(os.getenv("RESPONSE_CACHE_SIZE", "1024")),
+    disk_path=os.getenv("RESPONSE_CACHE_DB") or None,
+)
+
+# Одинаковые одновременные запросы к Gemini выполняются один раз
+inflight = SingleFlight()
+
+# Ограничение частоты запросов к Gemini: на пользователя, на чат и общее (в минуту)
+rate_limiter = RateLimiter(
+    user_per_minute=float(os.getenv("RATE_USER_PER_MIN", "6")),
+    user_burst=int(os.getenv("RATE_USER_BURST", "3")),
+    chat_per_minute=float(os.getenv("RATE_CHAT_PER_MIN", "30")),
+    chat_burst=int(os.getenv("RATE_CHAT_BURST", "10")),
+    global_per_minute=float(os.getenv("RATE_GLOBAL_PER_MIN", "60")) / SHARD_COUNT,
+    global_burst=int(os.getenv("RATE_GLOBAL_BURST", "20")),
+)
+
+# Формат ответов: HTML или MarkdownV2 (см. formatting.py)
+REPLY_PARSE_MODE = ParseMode(os.getenv("REPLY_PARSE_MODE", ParseMode.HTML))
+
+# Очередь исходящих сообщений с лимитами Telegram
+outbox = Outbox(
+    global_per_second=max(1, int(os.getenv("TELEGRAM_GLOBAL_PER_SEC", "30")) // SHARD_COUNT),
+    group_per_minute=int(os.getenv("TELEGRAM_GROUP_PER_MIN", "20")),
+)
+
+# Потоковый режим: "думаю..." редактируется по мере генерации ответа
+STREAMING_ENABLED = os.getenv("GEMINI_STREAMING", "1") == "1"
+# Не чаще одной правки сообщения за столько секунд (лимиты Telegram)
+STREAM_EDIT_INTERVAL = float(os.getenv("STREAM_EDIT_INTERVAL", "2.0"))
+
+# Параллельная обработка разных чатов/веток с сохранением порядка внутри каждого
+PARALLEL_UPDATES = os.getenv("PARALLEL_UPDATES", "1") == "1"
+DISPATCH_MAX_WORKERS = int(os.getenv("DISPATCH_MAX_WORKERS", "16"))
+DISPATCH_QUEUE_DEPTH = int(os.getenv("DISPATCH_QUEUE_DEPTH", "20"))
+dispatcher = ChatDispatcher(
+    max_workers=DISPATCH_MAX_WORKERS, max_queue_depth=DISPATCH_QUEUE_DEPTH
+)
+
+
+def outbox_wait_quantiles(stats):
+    return {("0.5",): stats["wait_p50"], ("0.95",): stats["wait_p95"]}
+
+
+# Очереди и запросы в работе читаются только при выдаче /metrics
+registry.gauge(
+    "gemini_in_flight",
+    "Gemini calls in progress",
+    ["model"],
+    func=lambda: {(tier.model_name,): tier.gemini.in_flight for tier in router.tiers},
+)
+registry.gauge(
+    "outbox_queue_depth",
+    "Telegram calls waiting in the outbox",
+    func=lambda: outbox.stats()["depth"],
+)
+registry.gauge(
+    "outbox_in_flight", "Telegram calls in progress", func=lambda: outbox.stats()["in_flight"]
+)
+registry.gauge(
+    "outbox_wait_seconds",
+    "Time Telegram calls spent queued in the outbox (last 1000 calls)",
+    ["quantile"],
+    func=lambda: outbox_wait_quantiles(outbox.stats()),
+)
+registry.gauge(
+    "response_cache_requests",
+    "Response cache lookups: hit, miss, or bypassed because of dialog history",
+    ["result"],
+    func=lambda: {
+        (result,): response_cache.stats()[result] for result in ("hits", "misses", "bypassed")
+    },
+)
+registry.gauge(
+    "gemini_coalesced_requests",
+    "Gemini requests served by an identical request already in flight",
+    func=lambda: inflight.stats()["coalesced"],
+)
+registry.gauge(
+    "gemini_retries",
+    "Gemini request retries after transient errors",
+    ["model"],
+    func=lambda: {(tier.model_name,): tier.gemini.stats()["retries"] for tier in router.tiers},
+)
+registry.gauge(
+    "gemini_hedges",
+    "Hedged (duplicate) Gemini requests",
+    ["model"],
+    func=lambda: {(tier.model_name,): tier.gemini.stats()["hedges"] for tier in router.tiers},
+)
+registry.gauge(
+    "gemini_breaker_state",
+    "Circuit breaker state per model (1 for the current state)",
+    ["model", "state"],
+    func=lambda: {
+        (tier.model_name, state): int(tier.gemini.breaker.state == state)
+        for tier in router.tiers
+        for state in ("closed", "half_open", "open")
+    },
+)
+registry.gauge(
+    "gemini_key_ejections",
+    "API keys ejected from the pool after quota errors",
+    ["model", "key"],
+    func=lambda: {
+        (tier.model_name, name): stats["ejections"]
+        for tier in router.tiers
+        for name, stats in tier.gemini.backend.model.stats().items()
+    },
+)
+registry.gauge(
+    "dispatcher_queue_depth",
+    "Updates waiting in per-chat queues",
+    func=lambda: dispatcher.queue_depth,
+)
+registry.gauge(
+    "dispatcher_dropped",
+    "Updates dropped on full per-chat queues",
+    func=lambda: dispatcher.dropped,
+)
+
+
+# Имена категорий и порогов вместо enum из google.generativeai.types:
+# SDK разбирает строки сам, а его импорт откладывается до первого запроса
+SAFETY_SETTINGS = {
+    "HARM_CATEGORY_SEXUALLY_EXPLICIT": "BLOCK_NONE",
+    "HARM_CATEGORY_DANGEROUS_CONTENT": "BLOCK_NONE",
+    "HARM_CATEGORY_HATE_SPEECH": "BLOCK_LOW_AND_ABOVE",
+    "HARM_CATEGORY_HARASSMENT": "BLOCK_LOW_AND_ABOVE",
+}
+
+
+def build_context(history):
+    # Формируем контекст: окно истории в виде реплик user/model;
+    # системная инструкция уже задана в модели (см. build_tier)
+    history.fit(PROMPT_TOKEN_BUDGET - token_estimator.count(system_instruction))
+    return history.to_contents()
+
+
+def cache_key_for(query, history, model_name):
+    # Ключ кеша ответов или None, если ответ зависит от истории диалога
+    return response_cache.key_for(
+        query, history, generation_config, model_name, system_instruction
+    )
+
+
+async def get_gemini_response(query, history, audit=None):
+    # audit — запись аудита запроса, сюда дописываются модель, кеш и токены
+    audit = {} if audit is None else audit
+    tier = router.route(query, history)
+    audit["model"] = tier.model_name
+    key = cache_key_for(query, history, tier.model_name)
+    if key is not None:
+        with span("cache_lookup"):
+            cached = await response_cache.get(key)
+        if cached is not None:
+            audit["cache"] = "hit"
+            return cached
+
+    started = time.perf_counter()
+    try:
+        contents = build_context(history)
+        response = await inflight.do(
+            request_key(contents, generation_config, tier.model_name),
+            lambda: tier.generate(
+                contents,
+                generation_config=generation_config,
+                safety_settings=SAFETY_SETTINGS,
+            ),
+        )
+        audit["gemini_seconds"] = round(time.perf_counter() - started, 3)
+        usage = response.usage_metadata
+        audit["input_tokens"] = usage.prompt_token_count
+        audit["output_tokens"] = usage.candidates_token_count
+        if response.candidates:
+            response_text = response.candidates[0].content.parts[0].text
+            if key is not None:
+                await response_cache.set(key, response_text)
+            return response_text  # Возвращаем текст без изменений
+        else:
+            logger.error("No candidates received from Gemini")
+            audit["error"] = "no_candidates"
+            return "Не удалось получить ответ от Gemini."
+    except Exception as e:
+        logger.error(f"Error getting response from Gemini: {str(e)}")
+        audit["error"] = type(e).__name__
+        return f"Произошла ошибка при обращении к Gemini: {str(e)}"
+
+
+async def stream_gemini_response(query, history, audit=None):
+    # Потоковый вариант get_gemini_response: отдаёт текст по частям
+    audit = {} if audit is None else audit
+    tier = router.route(query, history)
+    audit["model"] = tier.model_name
+    key = cache_key_for(query, history, tier.model_name)
+    if key is not None:
+        with span("cache_lookup"):
+            cached = await response_cache.get(key)
+        if cached is not None:
+            audit["cache"] = "hit"
+            yield cached
+            return
+
+    def record_usage(usage):
+        # Расход токенов приходит в последнем чанке потока
+        audit["input_tokens"] = usage.prompt_token_count
+        audit["output_tokens"] = usage.candidates_token_count
+
+    started = time.perf_counter()
+    contents = build_context(history)
+    parts = []
+    async for text in inflight.stream(
+        request_key(contents, generation_config, tier.model_name),
+        lambda: tier.stream(
+            contents,
+            generation_config=generation_config,
+            safety_settings=SAFETY_SETTINGS,
+            on_usage=record_usage,
+        ),
+    ):
+        if not parts:
+            audit["first_chunk_seconds"] = round(time.perf_counter() - started, 3)
+        parts.append(text)
+        yield text
+    audit["gemini_seconds"] = round(time.perf_counter() - started, 3)
+    if key is not None and parts:
+        await response_cache.set(key, "".join(parts))
+
+
+def render_reply(text):
+    started = time.perf_counter()
+    with span("render", chars=len(text)):
+        rendered = format_reply(text, REPLY_PARSE_MODE)
+    RENDER_SECONDS.time(started)
+    return rendered
+
+
+async def count_update(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    UPDATES_RECEIVED.inc()
+
+
+async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    # Сюда попадают только обращения к боту в разрешённых группах (см. addressed_to_bot)
+    message = update.message
+    query = message.text.strip()
+    bot_username = context.bot.username
+    key = conversation_key(update.effective_chat.id, topic_id(message), update.effective_user.id)
+
+    # Вопрос, который не влезет в бюджет даже без истории, отклоняем сразу
+    prompt_tokens = token_estimator.count(query) + token_estimator.count(system_instruction)
+    if prompt_tokens > PROMPT_TOKEN_BUDGET:
+        UPDATES_REJECTED.inc(labels=("prompt_too_long",))
+        logger.info(f"Rejected oversized prompt: ~{prompt_tokens} tokens")
+        await outbox.send(
+            update.effective_chat.id,
+            lambda: message.reply_text(
+                f"Слишком длинное сообщение: примерно {prompt_tokens} токенов "
+                f"при лимите {PROMPT_TOKEN_BUDGET}. Сократите вопрос."
+            ),
+            priority=PLACEHOLDER,
+        )
+        return
+
+    started = time.perf_counter()
+    with span("history_load"):
+        history = await conversations.get(key)
+
+    # Ставим "думаю..." в очередь, но не ждём его: в группе он может простоять
+    # до минуты из-за лимитов Telegram, а генерация начинается сразу
+    placeholder = outbox.submit(
+        update.effective_chat.id,
+        lambda: context.bot.send_message(
+            chat_id=update.effective_chat.id,
+            text="_думаю..._",  # Курсив в Markdown
+            parse_mode=ParseMode.MARKDOWN,
+            message_thread_id=message.message_thread_id,
+        ),
+        priority=PLACEHOLDER,
+    )
+
+    # Упоминание распознаётся без учёта регистра (см. addressed_to_bot) — и вырезается так же
+    query = re.sub(rf"@{re.escape(bot_username)}(?!\w)", "", query, flags=re.IGNORECASE).strip()
+    audit = {
+        "update_id": update.update_id,
+        "chat_id": update.effective_chat.id,
+        "thread_id": message.message_thread_id,
+        "user_id": update.effective_user.id,
+        "prompt_tokens_est": prompt_tokens,
+        "stream": STREAMING_ENABLED,
+    }
+
+    try:
+        # Добавляем вопрос пользователя в историю
+        conversations.append(key, history, "user", query)
+
+        if STREAMING_ENABLED:
+            # Ответ появляется в сообщении "думаю..." по мере генерации
+            with span("stream_reply"):
+                response = await stream_to_message(
+                    context.bot,
+                    chat_id=update.effective_chat.id,
+                    message_id=None,
+                    chunks=stream_gemini_response(query, history, audit),
+                    edit_interval=STREAM_EDIT_INTERVAL,
+                    parse_mode=REPLY_PARSE_MODE,
+                    render=render_reply,
+                    message_thread_id=message.message_thread_id,
+                    outbox=outbox,
+                    placeholder=placeholder,
+                )
+            if not response:
+                response = "Не удалось получить ответ от Gemini."
+                sent = await placeholder
+                await outbox.send(update.effective_chat.id, lambda: sent.edit_text(response))
+        else:
+            response = await get_gemini_response(query, history, audit)
+            # Ответ готов раньше, чем "думаю..." дождался очереди, — он уже не нужен
+            placeholder.cancel()
+
+            # Отправляем ответ в той же ветке (длинный — несколькими сообщениями)
+            with span("send_reply"):
+                await send_reply(
+                    context.bot,
+                    update.effective_chat.id,
+                    response,
+                    render=render_reply,
+                    parse_mode=REPLY_PARSE_MODE,
+                    message_thread_id=message.message_thread_id,
+                    outbox=outbox,
+                )
+
+        # Добавляем ответ Gemini в историю
+        conversations.append(key, history, "assistant", response)
+        UPDATES_ANSWERED.inc()
+        HANDLE_SECONDS.time(started)
+        audit_log.record(
+            **audit,
+            seconds=round(time.perf_counter() - started, 3),
+            query=query,
+            response=response,
+        )
+    except Exception as e:
+        placeholder.cancel()
+        HANDLER_ERRORS.inc(labels=(type(e).__name__,))
+        audit.setdefault("error", type(e).__name__)
+        audit_log.record(
+            **audit, seconds=round(time.perf_counter() - started, 3), query=query
+        )
+        error_text = f"Произошла ошибка: {str(e)}"
+        await outbox.send(update.effective_chat.id, lambda: message.reply_text(error_text))
+
+
+async def error_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    logger.error(msg="Exception while handling an update:", exc_info=context.error)
+
+
+# Тексты приветствия /start; START_TEXT выбирает один из них
+START_TEXTS = {
+    "full": "Привет!\n"
+            "Я -  бот на основе Gemini-flesh.\n\n"
+            "Для общения со мной, называйте меня в сообщении \n"
+            "по @{bot_username} или  сделайте ответ (replay) на мои сообщения, чтобы я вам ответил. \n\n"
+            "команды:\n"
+            " /start - запуск бота\n"
+            " /clear - удаление истории сообщений\n\n"
+            "Я общаюсь только в телеграм-группе Беседка...\n\n"
+            "    © @Don_Dron",
+    "short": "Привет!\n"
+             "Я -  бот на основе Gemini-flesh.\n\n"
+             "Для общения со мной, называйте меня в сообщении по @{bot_username} или  сделайте ответ (replay) на мои сообщения, чтобы я вам ответил. \n\n"
+             "Я общаюсь только в телеграм-группе Беседка...\n\n"
+             "© @Don_Dron",
+    "simple": "Привет! Я - Gemini бот. Обращайтесь по @{bot_username} или отвечайте на мои сообщения, чтобы получить ответ.",
+    "plain": "Привет! Я бот, использующий модель Gemini от Google.",
+}
+START_TEXT = START_TEXTS[os.getenv("START_TEXT", "full")]
+
+
+async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    bot_username = context.bot.username
+    await outbox.send(update.effective_chat.id, lambda: context.bot.send_message(
+        chat_id=update.effective_chat.id,
+        text=START_TEXT.format(bot_username=bot_username),
+        message_thread_id=update.effective_message.message_thread_id
+    ))
+
+
+async def clear(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    key = conversation_key(
+        update.effective_chat.id,
+        topic_id(update.effective_message),
+        update.effective_user.id,
+    )
+    await conversations.clear(key)
+    await outbox.send(update.effective_chat.id, lambda: context.bot.send_message(
+        chat_id=update.effective_chat.id, 
+        text="История сообщений очищена.",
+        message_thread_id=update.effective_message.message_thread_id 
+    ))
+
+
+async def profile(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    # /profile [cpu|memory] [секунды] — только для ADMIN_USER_IDS
+    if update.effective_user.id not in ADMIN_USER_IDS:
+        logger.warning(f"Ignored /profile from non-admin {update.effective_user.id}")
+        return
+    args = context.args or []
+    kind = args[0] if args else "cpu"
+    try:
+        seconds = min(float(args[1]) if len(args) > 1 else 10.0, PROFILE_MAX_SECONDS)
+    except ValueError:
+        seconds = 0
+    if kind not in ("cpu", "memory") or seconds <= 0:
+        text = "Использование: /profile [cpu|memory] [секунды]"
+    else:
+        # cProfile и tracemalloc нужны только администратору, не при каждом старте
+        from . import profiler
+
+        capture = profiler.capture_cpu if kind == "cpu" else profiler.capture_memory
+        try:
+            path, summary = await capture(seconds, PROFILE_DIR)
+            text = f"Профиль ({kind}, {seconds:g} с) записан в {path}\n\n{summary[:3000]}"
+        except profiler.ProfilerBusy as e:
+            text = str(e)
+    await outbox.send(update.effective_chat.id, lambda: context.bot.send_message(
+        chat_id=update.effective_chat.id,
+        text=text,
+        message_thread_id=update.effective_message.message_thread_id,
+    ))
+
+
+async def on_startup(application):
+    # get_me выполняется один раз при initialize(), дальше берём данные из кеша
+    addressed_to_bot.set_bot(application.bot.bot)
+    await conversations.open()
+    outbox.start()
+    if SHARD_COUNT > 1:
+        for log, path in ((audit_log, AUDIT_LOG_PATH), (trace_log, TRACE_LOG_PATH)):
+            root, ext = os.path.splitext(path)
+            log.path = f"{root}-{os.getenv('SHARD_INDEX', '0')}{ext}"
+    await audit_log.start()
+    await trace_log.start()
+    if METRICS_PORT:
+        global metrics_runner
+        port = METRICS_PORT + int(os.getenv("SHARD_INDEX", "0"))
+        metrics_runner = await start_metrics_server(METRICS_HOST, port)
+    logger.info(f"Bot identity: @{application.bot.username}")
+
+
+async def on_shutdown(application):
+    await dispatcher.shutdown()
+    await outbox.stop()
+    await audit_log.stop()
+    await trace_log.stop()
+    await conversations.close()
+    router.shutdown()
+    if metrics_runner is not None:
+        await metrics_runner.cleanup()
+
+
+def traced(callback):
+    # Трасса на время обработки апдейта; стадии отмечаются span(...) внутри
+    async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        with tracer.trace(update.update_id, update.effective_chat.id):
+            await callback(update, context)
+
+    return wrapper
+
+
+def rate_limited(callback):
+    # Лимит проверяется до постановки в очередь чата: отклонённые апдейты не занимают
+    # место в очереди и не ждут текущую генерацию. Уведомление не ожидаем — иначе
+    # лимиты Telegram на группу задержали бы приём следующих апдейтов
+    async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        wait = rate_limiter.check(update.effective_user.id, update.effective_chat.id)
+        if not wait:
+            await callback(update, context)
+            return
+        UPDATES_REJECTED.inc(labels=("rate_limit",))
+        logger.info(f"Rate limited user {update.effective_user.id} for {wait:.0f}s")
+        if rate_limiter.should_notify(update.effective_user.id, wait):
+            notice = outbox.submit(
+                update.effective_chat.id,
+                lambda: update.message.reply_text(
+                    f"Слишком много запросов, попробуйте через {math.ceil(wait)} с."
+                ),
+                priority=PLACEHOLDER,
+            )
+            notice.add_done_callback(lambda f: f.cancelled() or f.exception())
+
+    return wrapper
+
+
+def dispatched(callback):
+    # В параллельном режиме хендлер выполняется в очереди своего чата
+    return dispatcher.wrap(callback) if PARALLEL_UPDATES else callback
+
+
+def build_application():
+    builder = ApplicationBuilder().token(BOT_TOKEN)
+    if TELEGRAM_API_URL:
+        builder = builder.base_url(TELEGRAM_API_URL)
+    application = builder.post_init(on_startup).post_shutdown(on_shutdown).build()
+
+    # Группа -1 видит каждый апдейт раньше остальных хендлеров
+    application.add_handler(TypeHandler(Update, count_update), group=-1)
+    application.add_handler(CommandHandler("start", dispatched(start)))
+    application.add_handler(CommandHandler("clear", dispatched(clear)))
+    application.add_handler(CommandHandler("profile", dispatched(profile)))
+    application.add_handler(
+        MessageHandler(
+            # Только новые сообщения: правки (edited_message) handle_message не обрабатывает
+            filters.UpdateType.MESSAGE & filters.TEXT & ~filters.COMMAND & addressed_to_bot,
+            rate_limited(dispatched(traced(handle_message))),
+        )
+    )
+    application.add_error_handler(error_handler)
+    return application
+
@@ -0,0 +1,55 @@
+# Быстрый фильтр обращений к боту.
+# Проверяет чат, реплай на сообщение бота и @упоминание по сущностям сообщения,
+# чтобы лишние апдейты из групп отсекались ещё до запуска хендлера.
+# Данные бота (id, username) задаются один раз при старте через set_bot().
+# allowed_chat_ids=None — любой чат; require_address=False — все сообщения разрешённых чатов.
+from telegram import MessageEntity
+from telegram.ext import filters
+
+from .metrics import registry
+
+UPDATES_FILTERED = registry.counter(
+    "bot_updates_filtered_total", "Text messages not addressed to the bot"
+)
+
+
+class AddressedToBot(filters.MessageFilter):
+    def __init__(self, allowed_chat_ids, require_address=True):
+        super().__init__(name="AddressedToBot")
+        self.allowed_chat_ids = None if allowed_chat_ids is None else frozenset(allowed_chat_ids)
+        self.require_address = require_address
+        self.bot_id = None
+        self.mention = None
+
+    def set_bot(self, user):
+        self.bot_id = user.id
+        self.mention = f"@{user.username}".lower()
+
+    def filter(self, message):
+        if self._addressed(message):
+            return True
+        UPDATES_FILTERED.inc()
+        return False
+
+    def _addressed(self, message):
+        if self.allowed_chat_ids is not None and message.chat.id not in self.allowed_chat_ids:
+            return False
+        if self.bot_id is None:
+            return False
+        if not self.require_address:
+            return True
+
+        reply = message.reply_to_message
+        if reply is not None and reply.from_user is not None:
+            if reply.from_user.id == self.bot_id:
+                return True
+
+        for entity in message.entities:
+            if entity.type == MessageEntity.MENTION:
+                # parse_entity учитывает UTF-16 смещения Telegram
+                if message.parse_entity(entity).lower() == self.mention:
+                    return True
+            elif entity.type == MessageEntity.TEXT_MENTION:
+                if entity.user is not None and entity.user.id == self.bot_id:
+                    return True
+        return False
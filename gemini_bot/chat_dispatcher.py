@@ -0,0 +1,75 @@
+# Параллельная обработка апдейтов разных чатов при строгом порядке внутри чата.
+# Каждый чат (и каждая ветка-топик форума) получает свою очередь;
+# очереди разных чатов обрабатываются одновременно, но не больше max_workers сразу.
+import asyncio
+import logging
+from collections import deque
+
+from .conversation_store import topic_id
+
+logger = logging.getLogger(__name__)
+
+
+def chat_key(update):
+    chat_id = update.effective_chat.id if update.effective_chat else None
+    message = update.effective_message
+    # Ключ совпадает с ключом диалога: ответ в цепочке обычной группы — та же очередь,
+    # иначе два хендлера одного диалога работали бы одновременно
+    thread_id = topic_id(message) if message is not None else None
+    return chat_id, thread_id
+
+
+class ChatDispatcher:
+    def __init__(self, max_workers=16, max_queue_depth=20):
+        self.max_workers = max_workers
+        self.max_queue_depth = max_queue_depth
+        self.dropped = 0
+        self._queues = {}
+        self._tasks = {}
+        self._semaphore = asyncio.Semaphore(max_workers)
+
+    @property
+    def queue_depth(self):
+        return sum(len(queue) for queue in self._queues.values())
+
+    def wrap(self, callback):
+        # Обёртка для хендлера: ставит апдейт в очередь его чата и сразу возвращает управление
+        async def enqueue(update, context):
+            self.submit(update, context, callback)
+
+        return enqueue
+
+    def submit(self, update, context, callback):
+        key = chat_key(update)
+        queue = self._queues.setdefault(key, deque())
+        if len(queue) >= self.max_queue_depth:
+            self.dropped += 1
+            logger.warning(f"Queue for chat {key} is full, dropping update {update.update_id}")
+            return False
+        queue.append((callback, update, context))
+        if key not in self._tasks:
+            self._tasks[key] = asyncio.create_task(self._drain(key))
+        return True
+
+    async def _drain(self, key):
+        queue = self._queues[key]
+        try:
+            while queue:
+                callback, update, context = queue.popleft()
+                async with self._semaphore:
+                    try:
+                        await callback(update, context)
+                    except Exception as e:
+                        await context.application.process_error(update, e)
+        finally:
+            del self._tasks[key]
+            del self._queues[key]
+
+    async def shutdown(self, timeout=10):
+        # Даём текущим обработчикам завершиться, остальное отменяем
+        tasks = list(self._tasks.values())
+        if not tasks:
+            return
+        done, pending = await asyncio.wait(tasks, timeout=timeout)
+        for task in pending:
+            task.cancel()
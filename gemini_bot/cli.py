@@ -0,0 +1,82 @@
+# Единая точка входа: python -m gemini_bot [--variant main5] (или python main.py).
+# Вариант задаёт настройки по умолчанию (variants.py), затем импортируется bot.py
+# и выбирается режим: polling, вебхук (WEBHOOK_URL) или несколько процессов (WORKERS).
+# Модули режимов импортируются только когда нужны.
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+from .variants import VARIANTS, apply_variant
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="gemini_bot", description="Telegram bot for Gemini")
+    parser.add_argument(
+        "--variant",
+        default=os.getenv("BOT_VARIANT", "main"),
+        help="settings preset (env BOT_VARIANT), see --list-variants",
+    )
+    parser.add_argument("--list-variants", action="store_true", help="print variants and exit")
+    parser.add_argument(
+        "--check", action="store_true", help="import the bot and build the application, then exit"
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    started = time.perf_counter()
+    args = parse_args(argv)
+    if args.list_variants:
+        for name, settings in VARIANTS.items():
+            print(name, " ".join(f"{key}={value}" for key, value in settings.items()))
+        return
+    try:
+        apply_variant(args.variant)
+    except ValueError as e:
+        sys.exit(str(e))
+
+    from . import bot
+
+    imported = time.perf_counter()
+    if args.check:
+        bot.build_application()
+        print(
+            f"variant={args.variant} import={imported - started:.3f}s "
+            f"build={time.perf_counter() - imported:.3f}s "
+            f"gemini_sdk_loaded={'google.generativeai' in sys.modules}"
+        )
+        return
+
+    if bot.WORKERS > 1:
+        # Этот процесс только принимает апдейты и раздаёт их рабочим процессам по chat_id
+        from .sharding import Supervisor
+
+        application = Supervisor(bot.build_application, bot.WORKERS).build_ingress(
+            bot.BOT_TOKEN, bot.TELEGRAM_API_URL
+        )
+    else:
+        application = bot.build_application()
+
+    bot.logger.info(f"Запуск бота ({args.variant}) за {time.perf_counter() - started:.2f} s...")
+    if bot.WEBHOOK_URL:
+        from .webhook import run_webhook
+
+        asyncio.run(
+            run_webhook(
+                application,
+                bot.WEBHOOK_URL,
+                listen=bot.WEBHOOK_LISTEN,
+                port=bot.WEBHOOK_PORT,
+                path=bot.WEBHOOK_PATH,
+                secret_token=bot.WEBHOOK_SECRET,
+                allowed_updates=bot.ALLOWED_UPDATES,
+                drop_pending_updates=bot.DROP_PENDING_UPDATES,
+            )
+        )
+    else:
+        # run_polling сам создаёт и закрывает event loop, nest_asyncio не нужен
+        application.run_polling(
+            drop_pending_updates=bot.DROP_PENDING_UPDATES, allowed_updates=bot.ALLOWED_UPDATES
+        )
@@ -0,0 +1,171 @@
+# Постоянное хранилище истории диалогов.
+# SQLite в режиме WAL на диске + LRU-кеш горячих диалогов в памяти.
+# Запись идёт пачками в фоне, все обращения к базе — в отдельном потоке,
+# чтобы не блокировать event loop. Ключ диалога: (chat_id, thread_id, user_id).
+import asyncio
+import logging
+import os
+import sqlite3
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from .history import ConversationHistory
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY,
+    chat_id INTEGER NOT NULL,
+    thread_id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    role TEXT NOT NULL,
+    content TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS messages_by_key ON messages (chat_id, thread_id, user_id, id);
+"""
+
+
+def topic_id(message):
+    # Ветка форума или None. В обычной группе Telegram тоже ставит message_thread_id
+    # у ответов (id корня цепочки ответов), но это не отдельный диалог
+    return message.message_thread_id if message.is_topic_message else None
+
+
+def conversation_key(chat_id, thread_id, user_id):
+    # Сообщения вне веток-топиков хранятся с thread_id = 0
+    return chat_id, thread_id or 0, user_id
+
+
+class ConversationStore:
+    def __init__(
+        self,
+        path,
+        cache_size=1024,
+        token_budget=8000,
+        load_limit=200,
+        flush_interval=0.5,
+        batch_size=500,
+    ):
+        self.path = path
+        self.cache_size = cache_size
+        self.token_budget = token_budget
+        self.load_limit = load_limit
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self._cache = OrderedDict()
+        self._pending = []
+        self._connection = None
+        # Один поток — одно соединение с базой, запросы выполняются строго по очереди
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite")
+        self._flush_task = None
+
+    async def _run(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, func, *args)
+
+    def _open(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        connection = sqlite3.connect(self.path, check_same_thread=False)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.executescript(SCHEMA)
+        self._connection = connection
+
+    async def open(self):
+        await self._run(self._open)
+        self._flush_task = asyncio.create_task(self._flush_loop())
+
+    async def close(self):
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+        await self.flush()
+        await self._run(self._connection.close)
+        self._executor.shutdown(wait=True)
+
+    async def get(self, key):
+        history = self._cache.get(key)
+        if history is not None:
+            self.cache_hits += 1
+            self._cache.move_to_end(key)
+            return history
+
+        self.cache_misses += 1
+        # Несброшенные записи этого диалога должны попасть в базу до чтения
+        await self.flush()
+        rows = await self._run(self._load, key)
+        history = self._cache.get(key)
+        if history is None:
+            history = ConversationHistory(token_budget=self.token_budget)
+            for role, content in reversed(rows):
+                history.append(role, content)
+            self._remember(key, history)
+        return history
+
+    def append(self, key, history, role, content):
+        # История в памяти обновляется сразу, в базу строка уйдёт со следующей пачкой
+        history.append(role, content)
+        self._remember(key, history)
+        self._pending.append((*key, role, content, time.time()))
+        if len(self._pending) >= self.batch_size:
+            asyncio.create_task(self.flush())
+
+    async def clear(self, key):
+        self._cache.pop(key, None)
+        self._pending = [row for row in self._pending if tuple(row[:3]) != key]
+        await self._run(self._delete, key)
+
+    async def flush(self):
+        if not self._pending:
+            return
+        rows, self._pending = self._pending, []
+        try:
+            await self._run(self._insert, rows)
+        except Exception:
+            # Не теряем строки: вернём их в начало очереди до следующей попытки
+            self._pending[:0] = rows
+            raise
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Error writing conversations to {self.path}: {str(e)}")
+
+    def _remember(self, key, history):
+        self._cache[key] = history
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def _load(self, key):
+        return self._connection.execute(
+            "SELECT role, content FROM messages "
+            "WHERE chat_id = ? AND thread_id = ? AND user_id = ? "
+            "ORDER BY id DESC LIMIT ?",
+            (*key, self.load_limit),
+        ).fetchall()
+
+    def _insert(self, rows):
+        with self._connection:
+            self._connection.executemany(
+                "INSERT INTO messages (chat_id, thread_id, user_id, role, content, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+
+    def _delete(self, key):
+        with self._connection:
+            self._connection.execute(
+                "DELETE FROM messages WHERE chat_id = ? AND thread_id = ? AND user_id = ?",
+                key,
+            )
@@ -0,0 +1,78 @@
+# Отправка готового ответа в Telegram.
+# Длинный ответ режется на куски (splitting.py), куски уходят по порядку
+# в ту же ветку (message_thread_id) без пауз между ними.
+# Первый кусок может заменить текст существующего сообщения ("думаю...").
+import asyncio
+import logging
+
+from telegram.error import BadRequest, RetryAfter
+
+from .outbox import FINAL
+from .splitting import split_reply
+
+logger = logging.getLogger(__name__)
+
+
+async def _with_retry(send):
+    try:
+        return await send()
+    except RetryAfter as e:
+        logger.warning(f"Flood control, retrying in {e.retry_after}s")
+        await asyncio.sleep(e.retry_after)
+        return await send()
+
+
+async def _deliver(
+    bot, chat_id, source, rendered, parse_mode, message_thread_id, edit_message_id, outbox
+):
+    def send(text, mode):
+        if edit_message_id is not None:
+            return bot.edit_message_text(
+                text, chat_id=chat_id, message_id=edit_message_id, parse_mode=mode
+            )
+        return bot.send_message(
+            chat_id=chat_id, text=text, parse_mode=mode, message_thread_id=message_thread_id
+        )
+
+    def queued(text, mode):
+        # Через очередь исходящих (она сама выдерживает лимиты и RetryAfter) или напрямую
+        if outbox is None:
+            return _with_retry(lambda: send(text, mode))
+        coalesce_key = ("edit", chat_id, edit_message_id) if edit_message_id else None
+        return outbox.send(
+            chat_id, lambda: send(text, mode), priority=FINAL, coalesce_key=coalesce_key
+        )
+
+    try:
+        return await queued(rendered, parse_mode)
+    except BadRequest as e:
+        if "not modified" in str(e).lower():
+            return None
+        # Разметку Telegram не принял — отправляем этот кусок без неё
+        logger.warning(f"Formatted message rejected, sending plain text: {e}")
+        return await queued(source, None)
+
+
+async def send_reply(
+    bot,
+    chat_id,
+    text,
+    render=None,
+    parse_mode=None,
+    message_thread_id=None,
+    edit_message_id=None,
+    outbox=None,
+):
+    parts = split_reply(text, render)
+    for index, (source, rendered) in enumerate(parts):
+        await _deliver(
+            bot,
+            chat_id,
+            source,
+            rendered,
+            parse_mode,
+            message_thread_id,
+            edit_message_id if index == 0 else None,
+            outbox,
+        )
+    return len(parts)
@@ -0,0 +1,178 @@
+# Локальная замена Gemini API для офлайн-проверок и бенчмарков.
+# Реализует generateContent и streamGenerateContent (REST v1beta) с настраиваемой
+# задержкой (медиана latency, разброс — логнормальный с параметром jitter) и квотой
+# запросов в минуту на каждый API-ключ (сверх квоты — 429). Дополнительно можно
+# подмешивать случайные сбои: error_rate — доля 503 UNAVAILABLE, throttle_rate — доля 429.
+# Запуск: python -m gemini_bot.fake_gemini --port 8081 --latency 0.3 --quota 15 --error-rate 0.05
+# Бот: GEMINI_ENDPOINT=http://127.0.0.1:8081
+import argparse
+import asyncio
+import json
+import logging
+import random
+import time
+from collections import defaultdict, deque
+
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+
+def _candidate_response(text, prompt_tokens=0, output_tokens=0):
+    return {
+        "candidates": [
+            {
+                "content": {"parts": [{"text": text}], "role": "model"},
+                "finishReason": "STOP",
+                "index": 0,
+            }
+        ],
+        "usageMetadata": {
+            "promptTokenCount": prompt_tokens,
+            "candidatesTokenCount": output_tokens,
+            "totalTokenCount": prompt_tokens + output_tokens,
+        },
+    }
+
+
+def _error(status, message, code):
+    return web.json_response(
+        {"error": {"code": status, "message": message, "status": code}}, status=status
+    )
+
+
+class FakeGemini:
+    def __init__(
+        self, latency=0.2, quota_per_minute=None, chunks=4, jitter=0.0, error_rate=0.0, throttle_rate=0.0
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.injected = defaultdict(int)
+        self.quota_per_minute = quota_per_minute
+        self.chunks = chunks
+        self.requests = defaultdict(int)
+        self.rejected = defaultdict(int)
+        self._calls = defaultdict(deque)
+
+    def _delay(self):
+        # Время генерации ответа: медиана latency, хвост — логнормальный
+        if self.jitter:
+            return self.latency * random.lognormvariate(0, self.jitter)
+        return self.latency
+
+    def _over_quota(self, key):
+        if not self.quota_per_minute:
+            return False
+        now = time.monotonic()
+        calls = self._calls[key]
+        while calls and calls[0] <= now - 60:
+            calls.popleft()
+        if len(calls) >= self.quota_per_minute:
+            return True
+        calls.append(now)
+        return False
+
+    def _answer(self, body):
+        # Ответ — эхо последней реплики пользователя
+        contents = body.get("contents") or [{}]
+        parts = contents[-1].get("parts") or [{}]
+        question = " ".join(part.get("text", "") for part in parts)
+        return f"Ответ на: {question[-200:]}"
+
+    async def _check(self, request):
+        key = request.headers.get("x-goog-api-key") or request.query.get("key", "")
+        self.requests[key] += 1
+        roll = random.random()
+        if self._over_quota(key) or roll < self.throttle_rate:
+            self.rejected[key] += 1
+            return key, _error(429, "Resource has been exhausted (e.g. check quota).", "RESOURCE_EXHAUSTED")
+        if roll < self.throttle_rate + self.error_rate:
+            self.injected["503"] += 1
+            return key, _error(503, "The service is currently unavailable.", "UNAVAILABLE")
+        return key, None
+
+    async def generate_content(self, request):
+        key, error = await self._check(request)
+        if error is not None:
+            return error
+        body = await request.json()
+        await asyncio.sleep(self._delay())
+        text = self._answer(body)
+        return web.json_response(_candidate_response(text, len(json.dumps(body)) // 4, len(text) // 4))
+
+    async def stream_generate_content(self, request):
+        # REST-стрим SDK: JSON-массив, элементы которого приходят по мере генерации
+        key, error = await self._check(request)
+        if error is not None:
+            return error
+        body = await request.json()
+        text = self._answer(body)
+        response = web.StreamResponse(headers={"Content-Type": "application/json"})
+        await response.prepare(request)
+        delay = self._delay()
+        step = max(1, len(text) // self.chunks)
+        pieces = [text[i:i + step] for i in range(0, len(text), step)]
+        await response.write(b"[")
+        for index, piece in enumerate(pieces):
+            await asyncio.sleep(delay / len(pieces))
+            separator = b"," if index else b""
+            # Как и настоящий API, расход токенов отдаём в последнем чанке
+            if index == len(pieces) - 1:
+                chunk = _candidate_response(piece, len(json.dumps(body)) // 4, len(text) // 4)
+            else:
+                chunk = _candidate_response(piece)
+            await response.write(separator + json.dumps(chunk).encode())
+        await response.write(b"]")
+        await response.write_eof()
+        return response
+
+    async def route(self, request):
+        method = request.match_info["method"]
+        if method == "generateContent":
+            return await self.generate_content(request)
+        if method == "streamGenerateContent":
+            return await self.stream_generate_content(request)
+        return _error(404, f"Unknown method {method}", "NOT_FOUND")
+
+    def app(self):
+        app = web.Application()
+        app.router.add_post("/v1beta/models/{model}:{method}", self.route)
+        return app
+
+
+async def start_fake_gemini(host="127.0.0.1", port=0, **options):
+    # Запуск внутри текущего event loop; возвращает (FakeGemini, runner, base_url)
+    fake = FakeGemini(**options)
+    runner = web.AppRunner(fake.app())
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return fake, runner, f"http://{host}:{port}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake Gemini API server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--jitter", type=float, default=0.0, help="lognormal sigma of latency")
+    parser.add_argument("--quota", type=int, default=None, help="requests per minute per key")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of 503 responses")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="share of 429 responses")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    fake = FakeGemini(
+        latency=args.latency,
+        quota_per_minute=args.quota,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        throttle_rate=args.throttle_rate,
+    )
+    web.run_app(fake.app(), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+# Локальная замена Telegram Bot API для офлайн-проверок и нагрузочных тестов.
+# Реализует методы, которые вызывает бот: getMe, sendMessage, editMessageText,
+# sendChatAction, get/set/deleteWebhook, getUpdates (апдейты из push_update; обычно
+# пусто — апдейты подаёт сам тест). Задержка ответа: медиана latency,
+# разброс — логнормальный (jitter).
+# Сбои отправки: error_rate — доля ответов 500, flood_rate — доля ответов 429
+# с retry_after (как при flood control). getMe и вебхуки не сбоят, чтобы бот стартовал.
+# Запуск: python -m gemini_bot.fake_telegram --port 8082 --latency 0.05 --flood-rate 0.02
+# Бот: TELEGRAM_API_URL=http://127.0.0.1:8082/bot
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import random
+import time
+from collections import Counter
+
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+BOT_USER = {
+    "id": 700000001,
+    "is_bot": True,
+    "first_name": "Fake",
+    "username": "fake_gemini_bot",
+    "can_join_groups": True,
+    "can_read_all_group_messages": False,
+    "supports_inline_queries": False,
+}
+
+
+# Методы, на которых имитируются сбои
+INJECTED_METHODS = frozenset({"sendMessage", "editMessageText", "sendChatAction"})
+
+
+def _ok(result):
+    return web.json_response({"ok": True, "result": result})
+
+
+def _error(status, description, parameters=None):
+    body = {"ok": False, "error_code": status, "description": description}
+    if parameters:
+        body["parameters"] = parameters
+    return web.json_response(body, status=status)
+
+
+def _chat(chat_id):
+    # Отрицательные id — группы, положительные — личные чаты
+    if chat_id < 0:
+        return {"id": chat_id, "type": "supergroup", "title": "Fake group", "is_forum": True}
+    return {"id": chat_id, "type": "private", "first_name": "User"}
+
+
+class FakeTelegram:
+    def __init__(self, latency=0.05, jitter=0.0, error_rate=0.0, flood_rate=0.0, retry_after=1):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.flood_rate = flood_rate
+        self.retry_after = retry_after
+        self.calls = Counter()
+        self.injected = Counter()
+        self.started = time.monotonic()
+        self._message_ids = itertools.count(1)
+        # Тексты отправленных и отредактированных сообщений по порядку
+        self.texts = []
+        # Апдейты, ожидающие getUpdates; deleteWebhook(drop_pending_updates) их сбрасывает
+        self.pending = []
+        self._update_ids = itertools.count(1)
+        self._arrived = asyncio.Event()
+
+    def push_update(self, update):
+        update = dict(update, update_id=next(self._update_ids))
+        self.pending.append(update)
+        self._arrived.set()
+        return update
+
+    def _delay(self):
+        if self.jitter:
+            return self.latency * random.lognormvariate(0, self.jitter)
+        return self.latency
+
+    async def _params(self, request):
+        # PTB шлёт параметры формой, значения-объекты закодированы в JSON
+        if request.content_type == "application/json":
+            return await request.json()
+        params = {}
+        for name, value in (await request.post()).items():
+            try:
+                params[name] = json.loads(value)
+            except (TypeError, ValueError):
+                params[name] = value
+        return params
+
+    def _message(self, params, message_id=None):
+        self.texts.append(str(params.get("text", "")))
+        message = {
+            "message_id": message_id or next(self._message_ids),
+            "date": int(time.time()),
+            "chat": _chat(int(params["chat_id"])),
+            "from": BOT_USER,
+            "text": str(params.get("text", "")),
+        }
+        if params.get("message_thread_id"):
+            message["message_thread_id"] = int(params["message_thread_id"])
+            message["is_topic_message"] = True
+        return message
+
+    async def route(self, request):
+        method = request.match_info["method"]
+        params = await self._params(request)
+        self.calls[method] += 1
+        await asyncio.sleep(self._delay())
+        if method in INJECTED_METHODS:
+            error = self._inject()
+            if error is not None:
+                return error
+        if method == "getUpdates":
+            return _ok(await self._get_updates(params))
+        return self.answer(method, params)
+
+    async def _get_updates(self, params):
+        # offset подтверждает уже полученные апдейты; без новых — long polling до timeout
+        offset = int(params.get("offset") or 0)
+        self.pending = [update for update in self.pending if update["update_id"] >= offset]
+        if not self.pending and params.get("timeout"):
+            self._arrived.clear()
+            try:
+                await asyncio.wait_for(self._arrived.wait(), float(params["timeout"]))
+            except asyncio.TimeoutError:
+                pass
+        return self.pending[: int(params.get("limit") or 100)]
+
+    def _inject(self):
+        roll = random.random()
+        if roll < self.flood_rate:
+            self.injected["429"] += 1
+            return _error(
+                429,
+                f"Too Many Requests: retry after {self.retry_after}",
+                {"retry_after": self.retry_after},
+            )
+        if roll < self.flood_rate + self.error_rate:
+            self.injected["500"] += 1
+            return _error(500, "Internal Server Error")
+        return None
+
+    def answer(self, method, params):
+        if method == "getMe":
+            return _ok(BOT_USER)
+        if method == "sendMessage":
+            return _ok(self._message(params))
+        if method == "editMessageText":
+            return _ok(self._message(params, int(params["message_id"])))
+        if method == "deleteWebhook" and params.get("drop_pending_updates"):
+            self.pending = []
+        if method in ("sendChatAction", "setWebhook", "deleteWebhook", "close", "logOut"):
+            return _ok(True)
+        if method == "getWebhookInfo":
+            return _ok({"url": "", "has_custom_certificate": False, "pending_update_count": 0})
+        return _error(404, "Not Found: method not found")
+
+    def app(self):
+        app = web.Application()
+        app.router.add_post("/bot{token}/{method}", self.route)
+        return app
+
+
+async def start_fake_telegram(host="127.0.0.1", port=0, **options):
+    # Запуск внутри текущего event loop; возвращает (FakeTelegram, runner, base_url)
+    fake = FakeTelegram(**options)
+    runner = web.AppRunner(fake.app(), access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return fake, runner, f"http://{host}:{port}/bot"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake Telegram Bot API server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8082)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--jitter", type=float, default=0.0, help="lognormal sigma of latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of 500 responses")
+    parser.add_argument("--flood-rate", type=float, default=0.0, help="share of 429 responses")
+    parser.add_argument("--retry-after", type=int, default=1)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    fake = FakeTelegram(
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        flood_rate=args.flood_rate,
+        retry_after=args.retry_after,
+    )
+    web.run_app(fake.app(), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
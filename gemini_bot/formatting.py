@@ -0,0 +1,106 @@
+# Форматирование ответа Gemini для Telegram.
+# Ответ разбирается за один проход (блоки кода, инлайн-код, жирный/курсив,
+# заголовки, списки, строки документации) и собирается заново в HTML
+# или MarkdownV2 с экранированием по правилам Telegram.
+# Всё, что не распознано как разметка, выводится как обычный экранированный текст,
+# поэтому результат всегда принимается Telegram.
+import re
+
+HTML = "HTML"
+MARKDOWN_V2 = "MarkdownV2"
+
+TOKEN = re.compile(
+    # Строка информации (язык) у блока кода — только если за ней идёт перевод строки:
+    # в ```print``` "print" — это код, а не язык
+    r"(?P<fence>```(?:(?P<lang>[\w+#-]*)[^\n`]*\n)?(?P<fence_body>.*?)(?:```|\Z))"
+    r'|(?P<doc>""".*?(?:"""|\Z))'
+    r"|(?P<code>`(?P<code_body>[^`\n]+)`)"
+    r"|(?P<bold>\*\*(?P<bold_body>\S(?:[^\n]*?\S)?)\*\*)"
+    r"|(?P<italic>(?<![\w*])\*(?P<italic_body>[^\s*](?:[^*\n]*?[^\s*])?)\*(?![\w*]))"
+    r"|(?P<heading>^[ \t]*#{1,6}[ \t]+(?P<heading_body>[^\n]+))"
+    r"|(?P<bullet>^(?P<indent>[ \t]*)[*+-][ \t]+)",
+    re.S | re.M,
+)
+
+_HTML_ESCAPE = str.maketrans({"&": "&amp;", "<": "&lt;", ">": "&gt;"})
+_MD_SPECIAL = "_*[]()~`>#+-=|{}.!\\"
+_MD_ESCAPE = str.maketrans({char: "\\" + char for char in _MD_SPECIAL})
+_MD_CODE_ESCAPE = str.maketrans({"`": "\\`", "\\": "\\\\"})
+
+
+def tokenize(text):
+    # (вид, текст, язык) — язык заполнен только у блоков кода.
+    # lastgroup — внешняя группа совпавшей альтернативы (она закрывается последней)
+    position = 0
+    for match in TOKEN.finditer(text):
+        start = match.start()
+        if start > position:
+            yield "text", text[position:start], None
+        kind = match.lastgroup
+        if kind == "fence":
+            yield "fence", match.group("fence_body"), match.group("lang")
+        elif kind == "doc":
+            # Строки документации выводим как есть: звёздочки внутри — не разметка
+            yield "text", match.group("doc"), None
+        elif kind == "heading":
+            # "## **Заголовок**" -> "Заголовок"
+            yield "heading", match.group("heading_body").replace("**", "").strip(), None
+        else:
+            yield kind, match.group(_BODIES[kind]), None
+        position = match.end()
+    if position < len(text):
+        yield "text", text[position:], None
+
+
+_BODIES = {
+    "code": "code_body",
+    "bold": "bold_body",
+    "italic": "italic_body",
+    "bullet": "indent",
+}
+
+
+def to_html(text):
+    out = []
+    for kind, value, lang in tokenize(text):
+        escaped = value.translate(_HTML_ESCAPE)
+        if kind == "text":
+            out.append(escaped)
+        elif kind == "fence":
+            if lang:
+                out.append(f'<pre><code class="language-{lang}">{escaped}</code></pre>')
+            else:
+                out.append(f"<pre>{escaped}</pre>")
+        elif kind == "code":
+            out.append(f"<code>{escaped}</code>")
+        elif kind in ("bold", "heading"):
+            out.append(f"<b>{escaped}</b>")
+        elif kind == "italic":
+            out.append(f"<i>{escaped}</i>")
+        elif kind == "bullet":
+            out.append(f"{escaped}• ")
+    return "".join(out)
+
+
+def to_markdown_v2(text):
+    out = []
+    for kind, value, lang in tokenize(text):
+        if kind == "fence":
+            out.append(f"```{lang or ''}\n{value.translate(_MD_CODE_ESCAPE)}```")
+        elif kind == "code":
+            out.append(f"`{value.translate(_MD_CODE_ESCAPE)}`")
+        elif kind in ("bold", "heading"):
+            out.append(f"*{value.translate(_MD_ESCAPE)}*")
+        elif kind == "italic":
+            out.append(f"_{value.translate(_MD_ESCAPE)}_")
+        elif kind == "bullet":
+            out.append(f"{value}• ")
+        else:
+            out.append(value.translate(_MD_ESCAPE))
+    return "".join(out)
+
+
+def format_reply(text, parse_mode=HTML):
+    if parse_mode == MARKDOWN_V2:
+        return to_markdown_v2(text)
+    return to_html(text)
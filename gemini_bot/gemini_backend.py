@@ -0,0 +1,145 @@
+# Неблокирующий доступ к Gemini.
+# Синхронный model.generate_content останавливает весь event loop бота,
+# поэтому запросы идут либо через async API SDK, либо через ограниченный пул потоков.
+import asyncio
+import functools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from .metrics import registry
+
+logger = logging.getLogger(__name__)
+
+GEMINI_TOKENS = registry.counter(
+    "gemini_tokens_total", "Gemini tokens by kind (prompt, cached, output)", ["model", "kind"]
+)
+
+
+class GeminiBackend:
+    def __init__(self, model, max_concurrency=8, use_async=True, on_usage=None):
+        self.model = model
+        # on_usage(contents, usage_metadata) — например, калибровка локальной оценки токенов
+        self.on_usage = on_usage
+        self.max_concurrency = max_concurrency
+        # Async API есть в google-generativeai >= 0.3, иначе уходим в пул потоков
+        self.use_async = use_async and hasattr(model, "generate_content_async")
+        self.in_flight = 0
+        # Расход токенов: prompt — весь вход, cached — часть входа из кеша контекста
+        self.prompt_tokens = 0
+        self.cached_tokens = 0
+        self.output_tokens = 0
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._executor = None
+
+    def _get_executor(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_concurrency, thread_name_prefix="gemini"
+            )
+        return self._executor
+
+    async def generate(self, contents, **kwargs):
+        # Не больше max_concurrency одновременных обращений к Gemini,
+        # остальные ждут своей очереди, не блокируя обработку других чатов
+        async with self._semaphore:
+            self.in_flight += 1
+            try:
+                if self.use_async:
+                    response = await self.model.generate_content_async(contents, **kwargs)
+                else:
+                    loop = asyncio.get_running_loop()
+                    response = await loop.run_in_executor(
+                        self._get_executor(),
+                        functools.partial(self.model.generate_content, contents, **kwargs),
+                    )
+                self._record_usage(contents, response)
+                return response
+            finally:
+                self.in_flight -= 1
+
+    async def stream(self, contents, on_usage=None, **kwargs):
+        # Потоковая генерация: отдаёт текст по мере прихода чанков от Gemini.
+        # Слот семафора занят до конца потока. on_usage(usage_metadata) получает
+        # расход токенов этого потока (например, для аудита)
+        async with self._semaphore:
+            self.in_flight += 1
+            try:
+                if self.use_async:
+                    response = await self.model.generate_content_async(
+                        contents, stream=True, **kwargs
+                    )
+                    chunk = None
+                    async for chunk in response:
+                        text = chunk_text(chunk)
+                        if text:
+                            yield text
+                    # Расход токенов приходит в последнем чанке
+                    self._record_usage(contents, chunk, on_usage)
+                else:
+                    async for text in self._stream_in_executor(contents, on_usage, **kwargs):
+                        yield text
+            finally:
+                self.in_flight -= 1
+
+    async def _stream_in_executor(self, contents, on_usage=None, **kwargs):
+        # Синхронный итератор SDK читается в потоке, чанки передаются в loop через очередь
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+        done = object()
+
+        def produce():
+            try:
+                for chunk in self.model.generate_content(contents, stream=True, **kwargs):
+                    loop.call_soon_threadsafe(queue.put_nowait, chunk)
+                loop.call_soon_threadsafe(queue.put_nowait, done)
+            except Exception as e:
+                loop.call_soon_threadsafe(queue.put_nowait, e)
+
+        future = loop.run_in_executor(self._get_executor(), produce)
+        chunk = None
+        while True:
+            item = await queue.get()
+            if item is done:
+                break
+            if isinstance(item, Exception):
+                raise item
+            chunk = item
+            text = chunk_text(item)
+            if text:
+                yield text
+        await future
+        self._record_usage(contents, chunk, on_usage)
+
+    def _record_usage(self, contents, response, on_usage=None):
+        usage = getattr(response, "usage_metadata", None)
+        if not usage or not usage.prompt_token_count:
+            return
+        self.prompt_tokens += usage.prompt_token_count
+        self.cached_tokens += usage.cached_content_token_count
+        self.output_tokens += usage.candidates_token_count
+        model_name = getattr(self.model, "model_name", "")
+        GEMINI_TOKENS.inc(usage.prompt_token_count, (model_name, "prompt"))
+        GEMINI_TOKENS.inc(usage.cached_content_token_count, (model_name, "cached"))
+        GEMINI_TOKENS.inc(usage.candidates_token_count, (model_name, "output"))
+        # Токены из кеша контекста не отправляются заново и оплачиваются по сниженной цене
+        logger.info(
+            f"Gemini tokens: input={usage.prompt_token_count} "
+            f"saved_by_cache={usage.cached_content_token_count} "
+            f"output={usage.candidates_token_count}"
+        )
+        if self.on_usage is not None:
+            self.on_usage(contents, usage)
+        if on_usage is not None:
+            on_usage(usage)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+
+def chunk_text(response):
+    # Текст первого кандидата или пустая строка, если ответ заблокирован/пуст
+    if not response.candidates or not response.candidates[0].content.parts:
+        return ""
+    return response.candidates[0].content.parts[0].text
@@ -0,0 +1,63 @@
+# История диалога с ограничением по токенам.
+# Хранится только скользящее окно последних реплик, суммарно не больше token_budget,
+# и передаётся в Gemini как multi-turn contents с ролями user/model.
+from collections import deque
+
+from .token_estimator import TURN_OVERHEAD, estimator as default_estimator, raw_tokens
+
+# Роли в истории бота -> роли Gemini API
+GEMINI_ROLES = {"user": "user", "assistant": "model", "model": "model"}
+
+
+class ConversationHistory:
+    def __init__(self, token_budget=8000, estimator=None):
+        self.token_budget = token_budget
+        self.estimator = estimator or default_estimator
+        self.turns = deque()
+        # Сырая оценка окна; в токены переводится по текущей калибровке
+        self.raw_tokens = 0
+
+    def __len__(self):
+        return len(self.turns)
+
+    def __iter__(self):
+        return iter(self.turns)
+
+    @property
+    def tokens(self):
+        return self.estimator.scale(self.raw_tokens)
+
+    def append(self, role, content):
+        self.turns.append({"role": role, "content": content})
+        self.raw_tokens += raw_tokens(content) + TURN_OVERHEAD
+        self._trim()
+
+    def clear(self):
+        self.turns.clear()
+        self.raw_tokens = 0
+
+    def fit(self, token_budget):
+        # Подрезает окно под бюджет конкретного запроса; возвращает оценку окна
+        self._trim(token_budget)
+        return self.tokens
+
+    def _trim(self, token_budget=None):
+        # Выкидываем старые реплики, пока окно не влезет в бюджет;
+        # последняя реплика остаётся всегда, окно начинается с реплики пользователя
+        budget = min(self.token_budget, token_budget or self.token_budget)
+        while len(self.turns) > 1 and (
+            self.tokens > budget or self.turns[0]["role"] != "user"
+        ):
+            self.raw_tokens -= raw_tokens(self.turns.popleft()["content"]) + TURN_OVERHEAD
+
+    def to_contents(self):
+        contents = []
+        for turn in self.turns:
+            role = GEMINI_ROLES[turn["role"]]
+            # Gemini ждёт чередования ролей: подряд идущие реплики одной роли склеиваем
+            # (например, вопрос, на который ответ не пришёл из-за ошибки)
+            if contents and contents[-1]["role"] == role:
+                contents[-1]["parts"].append(turn["content"])
+            else:
+                contents.append({"role": role, "parts": [turn["content"]]})
+        return contents
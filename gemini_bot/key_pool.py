@@ -0,0 +1,288 @@
+# Пул API-ключей Gemini.
+# Каждый ключ — своя модель со своим клиентом; запрос уходит на наименее
+# загруженный ключ (или по кругу). Ключ, получивший 429, временно исключается
+# из пула, и запрос повторяется на следующем. Последний рабочий ключ не исключается:
+# его 429 уходит выше, и ResilientGemini повторяет запрос с задержкой.
+# Снаружи пул выглядит как GenerativeModel, так что GeminiBackend работает с ним как с моделью.
+import asyncio
+import datetime
+import functools
+import importlib
+import itertools
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# SDK Gemini импортируется лениво: один google.generativeai занимает
+# больше секунды холодного старта, а модели создаются только при первом запросе
+
+
+@functools.lru_cache(maxsize=None)
+def quota_errors():
+    from google.api_core import exceptions as api_exceptions
+
+    return (api_exceptions.ResourceExhausted, api_exceptions.TooManyRequests)
+
+
+def make_model(model_name, api_key, endpoint=None, system_instruction=None, cached_content=None):
+    # Персона передаётся как системная инструкция модели (google-generativeai >= 0.5),
+    # а не приклеивается к первой реплике. Модель с кешированным контекстом
+    # (cached_content) уже содержит инструкцию и не может задавать её повторно.
+    # Клиенты с нужным ключом подставляются в модель напрямую: SDK умеет только
+    # глобальный genai.configure.
+    import google.ai.generativelanguage as glm
+    import google.generativeai as genai
+
+    if cached_content is not None:
+        model = genai.GenerativeModel(model_name=model_name)
+        model._cached_content = cached_content
+    else:
+        model = genai.GenerativeModel(model_name=model_name, system_instruction=system_instruction)
+    if api_key is None and endpoint is None:
+        # Без ключа — клиенты по умолчанию (genai.configure / переменные окружения)
+        return model
+    options = {"api_key": api_key}
+    if endpoint:
+        # Локальный/сторонний endpoint (например fake_gemini.py) — только REST и синхронно
+        options["api_endpoint"] = endpoint
+        model._client = glm.GenerativeServiceClient(transport="rest", client_options=options)
+    else:
+        model._client = glm.GenerativeServiceClient(client_options=options)
+        model._async_client = glm.GenerativeServiceAsyncClient(client_options=options)
+    return model
+
+
+def create_cached_content(model_name, api_key, system_instruction, ttl):
+    # Кеш контекста Gemini хранится на стороне API отдельно для каждого ключа
+    import google.ai.generativelanguage as glm
+    from google.generativeai import client as genai_client
+    from google.generativeai.types import content_types
+
+    client = (
+        glm.CacheServiceClient(client_options={"api_key": api_key})
+        if api_key is not None
+        else genai_client.get_default_cache_client()
+    )
+    name = model_name if "/" in model_name else "models/" + model_name
+    cached = client.create_cached_content(
+        cached_content=glm.CachedContent(
+            model=name,
+            system_instruction=content_types.to_content(system_instruction),
+            ttl=datetime.timedelta(seconds=ttl),
+        )
+    )
+    return cached.name
+
+
+class ApiKey:
+    def __init__(self, name, model_name, api_key, endpoint=None, system_instruction=None, cache_ttl=None):
+        self.name = name
+        self.model_name = model_name
+        self.api_key = api_key
+        self.endpoint = endpoint
+        self.system_instruction = system_instruction
+        # Кеш контекста есть только у настоящего API
+        self.cache_ttl = cache_ttl if not endpoint else None
+        self.in_flight = 0
+        self.requests = 0
+        self.quota_errors = 0
+        self.ejections = 0
+        self.ejected_until = 0.0
+        self.cooldown = 0.0
+        self._model = None
+        self._expires_at = None
+        self._refresh_lock = asyncio.Lock()
+
+    def _stale(self):
+        return self._model is None or (
+            self._expires_at is not None and time.monotonic() >= self._expires_at
+        )
+
+    @property
+    def model(self):
+        # Модель создаётся один раз при первом запросе и пересоздаётся только когда
+        # истекает кеш контекста. Синхронный путь уже выполняется в пуле потоков
+        if self._stale():
+            self._install(self._cached_content())
+        return self._model
+
+    async def model_async(self):
+        # Для async API: импорт SDK (больше секунды) и создание кеша контекста
+        # (синхронный вызов API) выполняются в потоке, а не в event loop.
+        # Сама модель создаётся в loop — async-клиент привязывается к нему
+        if self._stale():
+            async with self._refresh_lock:
+                if self._stale():
+                    self._install(await asyncio.to_thread(self._prepare))
+        return self._model
+
+    def _prepare(self):
+        importlib.import_module("google.generativeai")
+        return self._cached_content()
+
+    def _install(self, cached_content):
+        self._model = make_model(
+            self.model_name,
+            self.api_key,
+            self.endpoint,
+            self.system_instruction,
+            cached_content,
+        )
+
+    def _cached_content(self):
+        self._expires_at = None
+        if not self.cache_ttl or not self.system_instruction:
+            return None
+        from google.api_core import exceptions as api_exceptions
+
+        try:
+            name = create_cached_content(
+                self.model_name, self.api_key, self.system_instruction, self.cache_ttl
+            )
+        except api_exceptions.GoogleAPICallError as e:
+            # Например, контекст меньше минимального размера кеша или модель его не поддерживает
+            logger.warning(f"Gemini {self.name}: context cache unavailable, using system_instruction: {e}")
+            self.cache_ttl = None
+            return None
+        # Пересоздаём модель чуть раньше, чем кеш истечёт на стороне API
+        self._expires_at = time.monotonic() + self.cache_ttl * 0.9
+        logger.info(f"Gemini {self.name}: cached context {name} for {self.cache_ttl}s")
+        return name
+
+    def healthy(self, now):
+        return self.ejected_until <= now
+
+
+class KeyPool:
+    def __init__(self, keys, strategy="least_loaded", cooldown=60.0, max_cooldown=600.0):
+        self.keys = keys
+        self.strategy = strategy
+        self.base_cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self._round_robin = itertools.cycle(self.keys)
+
+    @classmethod
+    def from_keys(
+        cls, model_name, api_keys, endpoint=None, system_instruction=None, cache_ttl=None, **options
+    ):
+        # Ключи в логах показываются по номеру, сами значения не логируются.
+        # Одна персона — одна модель на ключ, она переиспользуется всеми запросами
+        keys = [
+            ApiKey(f"key{index}", model_name, api_key, endpoint, system_instruction, cache_ttl)
+            for index, api_key in enumerate(api_keys)
+        ]
+        return cls(keys, **options)
+
+    @property
+    def model_name(self):
+        # Как у GenerativeModel: "gemini-1.5-flash" -> "models/gemini-1.5-flash"
+        name = self.keys[0].model_name
+        return name if "/" in name else "models/" + name
+
+    def _pick(self, tried):
+        now = time.monotonic()
+        healthy = [key for key in self.keys if key.healthy(now) and key not in tried]
+        if not healthy:
+            if tried:
+                return None
+            # Все ключи исключены одновременными 429 — берём тот, что вернётся раньше всех
+            return min(self.keys, key=lambda key: key.ejected_until)
+        if self.strategy == "round_robin":
+            for key in itertools.islice(self._round_robin, len(self.keys)):
+                if key in healthy:
+                    return key
+        return min(healthy, key=lambda key: (key.in_flight, key.requests))
+
+    def _eject(self, key, error):
+        key.quota_errors += 1
+        now = time.monotonic()
+        if not any(other.healthy(now) for other in self.keys if other is not key):
+            # Без последнего ключа все запросы к модели сразу падали бы на время паузы
+            logger.warning(f"Gemini {key.name} hit quota, kept as the last healthy key: {error}")
+            return
+        # Повторные 429 подряд — пауза удваивается
+        key.cooldown = min(self.max_cooldown, key.cooldown * 2 or self.base_cooldown)
+        key.ejected_until = now + key.cooldown
+        key.ejections += 1
+        logger.warning(f"Gemini {key.name} hit quota, ejected for {key.cooldown:.0f}s: {error}")
+
+    def _next_key(self, tried, last_error):
+        # Ключей не осталось только после 429 на каждом — отдаём последнюю ошибку квоты
+        key = self._pick(tried)
+        if key is None:
+            raise last_error
+        tried.add(key)
+        return key
+
+    def _streaming(self, key, response):
+        # Поток занимает ключ до последнего чанка, а не до первого
+        try:
+            yield from response
+        finally:
+            key.in_flight -= 1
+
+    async def _streaming_async(self, key, response):
+        try:
+            async for chunk in response:
+                yield chunk
+        finally:
+            key.in_flight -= 1
+
+    def generate_content(self, contents, **kwargs):
+        tried, last_error = set(), None
+        while True:
+            key = self._next_key(tried, last_error)
+            key.in_flight += 1
+            key.requests += 1
+            try:
+                result = key.model.generate_content(contents, **kwargs)
+            except quota_errors() as e:
+                key.in_flight -= 1
+                self._eject(key, e)
+                last_error = e
+                continue
+            except BaseException:
+                key.in_flight -= 1
+                raise
+            key.cooldown = 0.0
+            if kwargs.get("stream"):
+                return self._streaming(key, result)
+            key.in_flight -= 1
+            return result
+
+    async def generate_content_async(self, contents, **kwargs):
+        tried, last_error = set(), None
+        while True:
+            key = self._next_key(tried, last_error)
+            key.in_flight += 1
+            key.requests += 1
+            try:
+                model = await key.model_async()
+                result = await model.generate_content_async(contents, **kwargs)
+            except quota_errors() as e:
+                key.in_flight -= 1
+                self._eject(key, e)
+                last_error = e
+                continue
+            except BaseException:
+                key.in_flight -= 1
+                raise
+            key.cooldown = 0.0
+            if kwargs.get("stream"):
+                return self._streaming_async(key, result)
+            key.in_flight -= 1
+            return result
+
+    def stats(self):
+        now = time.monotonic()
+        return {
+            key.name: {
+                "in_flight": key.in_flight,
+                "requests": key.requests,
+                "quota_errors": key.quota_errors,
+                "ejections": key.ejections,
+                "ejected_for": max(0.0, key.ejected_until - now),
+            }
+            for key in self.keys
+        }
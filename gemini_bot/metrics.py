@@ -0,0 +1,146 @@
+# Метрики в текстовом формате Prometheus на локальном HTTP-порту (GET /metrics).
+# Запись — обычные операции над dict/list без блокировок: бот живёт в одном event loop,
+# а отдельные инкременты из потоков пула под GIL в худшем случае теряют единицу.
+# Значения, которые и так где-то хранятся (глубина очередей, запросы в работе),
+# не пишутся на горячем пути, а читаются функциями в момент запроса /metrics.
+import bisect
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# Границы корзин гистограмм задержек, секунды
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def _labels(names, values):
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{value}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.values = {}
+
+    def inc(self, amount=1, labels=()):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def samples(self):
+        for labels, value in self.values.items():
+            yield self.name, _labels(self.labelnames, labels), value
+
+
+class Gauge:
+    kind = "gauge"
+
+    def __init__(self, name, help, labelnames=(), func=None):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        # func() -> число или {значения меток: число}; вызывается только при выдаче метрик
+        self.func = func
+        self.values = {}
+
+    def set(self, value, labels=()):
+        self.values[labels] = value
+
+    def samples(self):
+        values = self.values
+        if self.func is not None:
+            result = self.func()
+            values = result if isinstance(result, dict) else {(): result}
+        for labels, value in values.items():
+            yield self.name, _labels(self.labelnames, labels), value
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+        # значения меток -> [счётчики по корзинам (последняя — +Inf), сумма]
+        self.values = {}
+
+    def observe(self, value, labels=()):
+        series = self.values.get(labels)
+        if series is None:
+            series = self.values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def time(self, started, labels=()):
+        # Наблюдение длительности от started (time.perf_counter())
+        self.observe(time.perf_counter() - started, labels)
+
+    def samples(self):
+        for labels, (counts, total) in self.values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                yield (
+                    self.name + "_bucket",
+                    _labels(self.labelnames + ("le",), labels + (bound,)),
+                    cumulative,
+                )
+            yield self.name + "_sum", _labels(self.labelnames, labels), total
+            yield self.name + "_count", _labels(self.labelnames, labels), cumulative
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = {}
+
+    def _add(self, metric):
+        # Повторная регистрация (например, при повторном импорте) возвращает ту же метрику
+        return self.metrics.setdefault(metric.name, metric)
+
+    def counter(self, name, help, labelnames=()):
+        return self._add(Counter(name, help, tuple(labelnames)))
+
+    def gauge(self, name, help, labelnames=(), func=None):
+        return self._add(Gauge(name, help, tuple(labelnames), func))
+
+    def histogram(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._add(Histogram(name, help, tuple(labelnames), buckets))
+
+    def render(self):
+        lines = []
+        for metric in list(self.metrics.values()):
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            try:
+                for name, labels, value in list(metric.samples()):
+                    lines.append(f"{name}{labels} {value}")
+            except Exception as e:
+                logger.error(f"Failed to collect metric {metric.name}: {e}")
+        return "\n".join(lines) + "\n"
+
+
+# Общий реестр процесса: модули объявляют свои метрики при импорте
+registry = Registry()
+
+
+async def start_metrics_server(host="127.0.0.1", port=9090, registry=registry):
+    # aiohttp нужен только серверу метрик, поэтому не импортируется вместе с модулем
+    from aiohttp import web
+
+    async def handle(request):
+        return web.Response(text=registry.render(), content_type="text/plain", charset="utf-8")
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.info(f"Metrics on http://{host}:{port}/metrics")
+    return runner
@@ -0,0 +1,161 @@
+# Выбор модели Gemini на каждый запрос.
+# Уровни (tiers) перечислены от дешёвого и быстрого к сильному. Короткая болтовня
+# уходит на первый, тяжёлые запросы (код, длинный вопрос, большая история) — на последний.
+# Если выбранный уровень сейчас сбоит или тормозит, запрос уходит на самый здоровый из остальных.
+# Каждое решение пишется в лог "model_router" для последующего анализа.
+import logging
+import re
+import time
+
+from .metrics import registry
+from .tracing import span
+
+logger = logging.getLogger(__name__)
+
+# Признаки кода в вопросе: блоки и фрагменты в обратных кавычках, объявления
+# (def f(, class A:, function f(), импорты и #include в начале строки,
+# операторы с ключевым словом, оканчивающиеся на ; { или }, SQL-запросы.
+# Отдельные слова вроде "return" или "class" в обычном тексте кодом не считаются
+CODE = re.compile(
+    r"```|`[^`\n]+`"
+    r"|\bdef\s+\w+\s*\("
+    r"|\bclass\s+\w+\s*[:({]"
+    r"|\bfunction\s*\w*\s*\("
+    r"|^[ \t]*(?:from\s+[\w.]+\s+)?import\s+(?:[{*]|[\w.]+[ \t]*(?:$|[;,]|as\b|from\b))"
+    r"|^[ \t]*#include\s*[<\"]"
+    # Сначала конец строки (просмотр вперёд), потом ключевое слово — без квадратичного перебора
+    r"|^(?=[^\n]*[;{}][ \t]*$)[^\n]*?"
+    r"(?:\b(?:return|const|let|var|public|private|static|void|int|else)\b|\b(?:if|for|while)\s*\()"
+    r"|(?i:\bselect\s+(?:\*|[\w.]+(?:\s*,\s*[\w.]+)*)\s+from\s+[\w.]+"
+    r"\s*(?:;|$|\b(?:where|join|order|group|limit)\b))",
+    re.MULTILINE,
+)
+
+
+GEMINI_SECONDS = registry.histogram(
+    "gemini_request_seconds", "Gemini call latency, including retries", ["model"]
+)
+GEMINI_ERRORS = registry.counter(
+    "gemini_errors_total", "Failed Gemini calls by error type", ["model", "type"]
+)
+
+
+def has_code(text):
+    return CODE.search(text) is not None
+
+
+class Tier:
+    def __init__(self, model_name, gemini, alpha=0.1):
+        self.model_name = model_name
+        self.gemini = gemini
+        self.alpha = alpha
+        # Скользящие средние (EWMA) задержки и доли ошибок
+        self.latency = None
+        self.error_rate = 0.0
+        self.routed = 0
+
+    def record(self, seconds, ok, error=None):
+        GEMINI_SECONDS.observe(seconds, (self.model_name,))
+        if error is not None:
+            GEMINI_ERRORS.inc(labels=(self.model_name, type(error).__name__))
+        if ok:
+            self.latency = seconds if self.latency is None else (
+                self.latency + self.alpha * (seconds - self.latency)
+            )
+        self.error_rate += self.alpha * ((0.0 if ok else 1.0) - self.error_rate)
+
+    def degraded(self, max_error_rate, max_latency):
+        breaker = getattr(self.gemini, "breaker", None)
+        if breaker is not None and breaker.state == "open":
+            return "circuit_open"
+        if self.error_rate > max_error_rate:
+            return "errors"
+        if self.latency is not None and self.latency > max_latency:
+            return "slow"
+        return None
+
+    async def generate(self, contents, **kwargs):
+        started = time.monotonic()
+        try:
+            with span("gemini.generate", model=self.model_name):
+                response = await self.gemini.generate(contents, **kwargs)
+        except Exception as e:
+            self.record(time.monotonic() - started, False, e)
+            raise
+        self.record(time.monotonic() - started, True)
+        return response
+
+    async def stream(self, contents, **kwargs):
+        started = time.monotonic()
+        try:
+            with span("gemini.stream", model=self.model_name):
+                async for text in self.gemini.stream(contents, **kwargs):
+                    yield text
+        except Exception as e:
+            self.record(time.monotonic() - started, False, e)
+            raise
+        self.record(time.monotonic() - started, True)
+
+    def shutdown(self):
+        self.gemini.shutdown()
+
+
+class ModelRouter:
+    def __init__(
+        self,
+        tiers,
+        heavy_chars=1500,
+        heavy_history_tokens=4000,
+        max_error_rate=0.3,
+        max_latency=20.0,
+    ):
+        self.tiers = tiers
+        self.heavy_chars = heavy_chars
+        self.heavy_history_tokens = heavy_history_tokens
+        self.max_error_rate = max_error_rate
+        self.max_latency = max_latency
+
+    def route(self, query, history):
+        code = has_code(query)
+        reasons = []
+        if code:
+            reasons.append("code")
+        if len(query) >= self.heavy_chars:
+            reasons.append("long_prompt")
+        if history.tokens >= self.heavy_history_tokens:
+            reasons.append("long_history")
+        tier = self.tiers[-1] if reasons else self.tiers[0]
+        reason = "+".join(reasons) or "light"
+
+        problem = tier.degraded(self.max_error_rate, self.max_latency)
+        if problem and len(self.tiers) > 1:
+            others = [other for other in self.tiers if other is not tier]
+            healthy = [
+                other for other in others
+                if not other.degraded(self.max_error_rate, self.max_latency)
+            ]
+            tier = min(healthy or others, key=lambda other: other.error_rate)
+            reason = f"{reason},fallback:{problem}"
+
+        tier.routed += 1
+        latency = "-" if tier.latency is None else f"{tier.latency:.2f}s"
+        logger.info(
+            f"Route model={tier.model_name} reason={reason} chars={len(query)} "
+            f"history_tokens={history.tokens} code={int(code)} "
+            f"latency={latency} error_rate={tier.error_rate:.2f}"
+        )
+        return tier
+
+    def shutdown(self):
+        for tier in self.tiers:
+            tier.shutdown()
+
+    def stats(self):
+        return {
+            tier.model_name: {
+                "routed": tier.routed,
+                "latency": tier.latency,
+                "error_rate": round(tier.error_rate, 3),
+            }
+            for tier in self.tiers
+        }
@@ -0,0 +1,224 @@
+# Очередь исходящих сообщений с учётом лимитов Telegram.
+# - не больше global_per_second сообщений в секунду на бота;
+# - в группе не больше group_per_minute сообщений в минуту, в личке — private_per_second в секунду;
+# - в одном чате одновременно выполняется один запрос, поэтому порядок сообщений сохраняется;
+# - финальные ответы идут раньше "думаю..." и промежуточных правок;
+# - при RetryAfter чат ставится на паузу, а запрос повторяется после неё.
+# Правки одного и того же сообщения (coalesce_key) схлопываются: в очереди остаётся последняя.
+# Отменённый future снимает ещё не отправленный запрос с очереди.
+import asyncio
+import bisect
+import itertools
+import logging
+import time
+from collections import deque
+
+from telegram.error import RetryAfter
+
+from .metrics import registry
+
+logger = logging.getLogger(__name__)
+
+TELEGRAM_SECONDS = registry.histogram("telegram_send_seconds", "Telegram Bot API call latency")
+TELEGRAM_ERRORS = registry.counter(
+    "telegram_errors_total", "Failed Telegram Bot API calls by error type", ["type"]
+)
+
+# Приоритеты: меньше — важнее
+FINAL = 0
+PLACEHOLDER = 1
+TYPING = 2
+
+
+class _Item:
+    __slots__ = ("priority", "seq", "chat_id", "call", "future", "coalesce_key", "enqueued_at", "retries")
+
+    def __init__(self, priority, seq, chat_id, call, future, coalesce_key):
+        self.priority = priority
+        self.seq = seq
+        self.chat_id = chat_id
+        self.call = call
+        self.future = future
+        self.coalesce_key = coalesce_key
+        self.enqueued_at = time.monotonic()
+        self.retries = 0
+
+    def __lt__(self, other):
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class Outbox:
+    def __init__(
+        self,
+        global_per_second=30,
+        group_per_minute=20,
+        private_per_second=1,
+        max_retries=3,
+    ):
+        self.global_per_second = global_per_second
+        self.group_per_minute = group_per_minute
+        self.private_per_second = private_per_second
+        self.max_retries = max_retries
+        self.sent = 0
+        self.retried = 0
+        self.coalesced = 0
+        self.wait_times = deque(maxlen=1000)
+        self._pending = []
+        self._by_key = {}
+        self._busy = set()
+        self._chat_sent = {}
+        self._global_sent = deque()
+        self._blocked_until = {}
+        self._seq = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._worker = None
+
+    def start(self):
+        self._worker = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            self._worker = None
+        for item in self._pending:
+            item.future.cancel()
+        self._pending.clear()
+        self._by_key.clear()
+
+    def submit(self, chat_id, call, priority=FINAL, coalesce_key=None):
+        # call — функция без аргументов, возвращающая корутину запроса к Bot API
+        future = asyncio.get_running_loop().create_future()
+        if coalesce_key is not None and coalesce_key in self._by_key:
+            # Новая правка того же сообщения заменяет ещё не отправленную старую
+            old = self._by_key.pop(coalesce_key)
+            self._pending.remove(old)
+            if not old.future.done():
+                old.future.set_result(None)
+            self.coalesced += 1
+            priority = min(priority, old.priority)
+        item = _Item(priority, next(self._seq), chat_id, call, future, coalesce_key)
+        self._insert(item)
+        future.add_done_callback(lambda future: future.cancelled() and self._discard(item))
+        return future
+
+    async def send(self, chat_id, call, priority=FINAL, coalesce_key=None):
+        return await self.submit(chat_id, call, priority, coalesce_key)
+
+    def stats(self):
+        waits = sorted(self.wait_times)
+        return {
+            "depth": len(self._pending),
+            "depth_final": sum(1 for item in self._pending if item.priority == FINAL),
+            "in_flight": len(self._busy),
+            "sent": self.sent,
+            "retried": self.retried,
+            "coalesced": self.coalesced,
+            "wait_p50": waits[len(waits) // 2] if waits else 0.0,
+            "wait_p95": waits[int(len(waits) * 0.95)] if waits else 0.0,
+        }
+
+    def _insert(self, item):
+        bisect.insort(self._pending, item)
+        if item.coalesce_key is not None:
+            self._by_key[item.coalesce_key] = item
+        self._wakeup.set()
+
+    def _discard(self, item):
+        if item in self._pending:
+            self._pending.remove(item)
+            if self._by_key.get(item.coalesce_key) is item:
+                del self._by_key[item.coalesce_key]
+
+    def _chat_window(self, chat_id):
+        # Группы (отрицательный id): group_per_minute за 60 с; личка: private_per_second за 1 с
+        if chat_id < 0:
+            return self.group_per_minute, 60.0
+        return self.private_per_second, 1.0
+
+    def _chat_ready_at(self, chat_id, now):
+        ready_at = self._blocked_until.get(chat_id, 0.0)
+        sent = self._chat_sent.get(chat_id)
+        if sent:
+            limit, window = self._chat_window(chat_id)
+            while sent and sent[0] <= now - window:
+                sent.popleft()
+            if len(sent) >= limit:
+                ready_at = max(ready_at, sent[0] + window)
+            if not sent:
+                del self._chat_sent[chat_id]
+        return ready_at
+
+    def _next_item(self, now):
+        # Первый по приоритету запрос, который можно отправить сейчас,
+        # либо None и время до ближайшей возможности
+        while self._global_sent and self._global_sent[0] <= now - 1.0:
+            self._global_sent.popleft()
+        if len(self._global_sent) >= self.global_per_second:
+            return None, self._global_sent[0] + 1.0 - now
+
+        soonest = None
+        for item in self._pending:
+            if item.chat_id in self._busy:
+                continue
+            ready_at = self._chat_ready_at(item.chat_id, now)
+            if ready_at <= now:
+                return item, None
+            soonest = ready_at if soonest is None else min(soonest, ready_at)
+        return None, (soonest - now if soonest is not None else None)
+
+    async def _run(self):
+        while True:
+            now = time.monotonic()
+            item, wait = self._next_item(now)
+            if item is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=wait)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            self._pending.remove(item)
+            if item.coalesce_key is not None and self._by_key.get(item.coalesce_key) is item:
+                del self._by_key[item.coalesce_key]
+            self._busy.add(item.chat_id)
+            self._chat_sent.setdefault(item.chat_id, deque()).append(now)
+            self._global_sent.append(now)
+            asyncio.create_task(self._execute(item, now))
+
+    async def _execute(self, item, started_at):
+        started = time.perf_counter()
+        try:
+            result = await item.call()
+        except RetryAfter as e:
+            TELEGRAM_SECONDS.time(started)
+            TELEGRAM_ERRORS.inc(labels=("RetryAfter",))
+            self.retried += 1
+            self._blocked_until[item.chat_id] = time.monotonic() + e.retry_after
+            logger.warning(f"Flood control in chat {item.chat_id}, pausing {e.retry_after}s")
+            item.retries += 1
+            if item.future.done():
+                pass
+            elif item.retries > self.max_retries:
+                item.future.set_exception(e)
+            elif item.coalesce_key in self._by_key:
+                # За время паузы пришла более свежая правка того же сообщения
+                item.future.set_result(None)
+            else:
+                self._insert(item)
+        except Exception as e:
+            TELEGRAM_SECONDS.time(started)
+            TELEGRAM_ERRORS.inc(labels=(type(e).__name__,))
+            if not item.future.done():
+                item.future.set_exception(e)
+        else:
+            TELEGRAM_SECONDS.time(started)
+            self.sent += 1
+            self.wait_times.append(started_at - item.enqueued_at)
+            if not item.future.done():
+                item.future.set_result(result)
+        finally:
+            self._busy.discard(item.chat_id)
+            if self._blocked_until.get(item.chat_id, 0.0) <= time.monotonic():
+                self._blocked_until.pop(item.chat_id, None)
+            self._wakeup.set()
@@ -0,0 +1,76 @@
+# Профилирование работающего бота по команде администратора:
+# cProfile (время CPU в потоке event loop) или tracemalloc (прирост памяти)
+# на заданное число секунд; результат пишется в logs/, в чат уходит краткая сводка.
+import asyncio
+import cProfile
+import io
+import os
+import pstats
+import time
+import tracemalloc
+
+_running = False
+
+
+class ProfilerBusy(RuntimeError):
+    pass
+
+
+def _output_path(directory, kind, extension):
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, f"{kind}-{time.strftime('%Y%m%d-%H%M%S')}.{extension}")
+
+
+async def _exclusive(capture, seconds, directory, top):
+    # Одновременно работает только один профилировщик
+    global _running
+    if _running:
+        raise ProfilerBusy("Профилирование уже идёт")
+    _running = True
+    try:
+        return await capture(seconds, directory, top)
+    finally:
+        _running = False
+
+
+async def _cpu(seconds, directory, top):
+    profile = cProfile.Profile()
+    profile.enable()
+    try:
+        await asyncio.sleep(seconds)
+    finally:
+        profile.disable()
+    path = _output_path(directory, "profile", "prof")
+    profile.dump_stats(path)
+    report = io.StringIO()
+    pstats.Stats(profile, stream=report).sort_stats("cumulative").print_stats(top)
+    with open(path[:-len("prof")] + "txt", "w", encoding="utf-8") as output:
+        output.write(report.getvalue())
+    return path, report.getvalue()
+
+
+async def _memory(seconds, directory, top):
+    started_here = not tracemalloc.is_tracing()
+    if started_here:
+        tracemalloc.start(25)
+    try:
+        before = tracemalloc.take_snapshot()
+        await asyncio.sleep(seconds)
+        after = tracemalloc.take_snapshot()
+    finally:
+        if started_here:
+            tracemalloc.stop()
+    path = _output_path(directory, "tracemalloc", "txt")
+    lines = [str(stat) for stat in after.compare_to(before, "lineno")[:top]]
+    summary = "\n".join(lines)
+    with open(path, "w", encoding="utf-8") as output:
+        output.write(summary + "\n")
+    return path, summary
+
+
+def capture_cpu(seconds, directory="logs", top=30):
+    return _exclusive(_cpu, seconds, directory, top)
+
+
+def capture_memory(seconds, directory="logs", top=30):
+    return _exclusive(_memory, seconds, directory, top)
@@ -0,0 +1,101 @@
+# Ограничение частоты обращений к Gemini: token bucket на пользователя, на чат и общий.
+# Отказ стоит одной проверки в памяти и не доходит до Gemini.
+# Корзины — словарь key -> [токены, время обновления]; полностью восстановившиеся
+# корзины периодически удаляются, так что память не растёт с числом пользователей.
+import time
+
+
+class TokenBuckets:
+    def __init__(self, rate, capacity):
+        self.rate = rate  # токенов в секунду
+        self.capacity = capacity
+        self._buckets = {}
+
+    def __len__(self):
+        return len(self._buckets)
+
+    def available(self, key, now):
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            return self.capacity
+        return min(self.capacity, bucket[0] + (now - bucket[1]) * self.rate)
+
+    def consume(self, key, tokens, now):
+        self._buckets[key] = [tokens - 1, now]
+
+    def wait_time(self, tokens):
+        return (1 - tokens) / self.rate
+
+    def sweep(self, now):
+        # Корзина, успевшая наполниться, ничем не отличается от новой
+        full_after = self.capacity / self.rate
+        idle = [key for key, (_, updated) in self._buckets.items() if now - updated >= full_after]
+        for key in idle:
+            del self._buckets[key]
+
+
+class RateLimiter:
+    def __init__(
+        self,
+        user_per_minute=6,
+        user_burst=3,
+        chat_per_minute=30,
+        chat_burst=10,
+        global_per_minute=60,
+        global_burst=20,
+        sweep_interval=60,
+    ):
+        self.users = TokenBuckets(user_per_minute / 60, user_burst)
+        self.chats = TokenBuckets(chat_per_minute / 60, chat_burst)
+        self.total = TokenBuckets(global_per_minute / 60, global_burst)
+        self.sweep_interval = sweep_interval
+        self.allowed = 0
+        self.rejected = 0
+        self._notified = {}
+        self._last_sweep = time.monotonic()
+
+    def check(self, user_id, chat_id):
+        # 0 — запрос разрешён, иначе через сколько секунд можно повторить.
+        # Токен списывается со всех корзин только если разрешают все три
+        now = time.monotonic()
+        if now - self._last_sweep >= self.sweep_interval:
+            self.sweep(now)
+
+        checks = ((self.users, user_id), (self.chats, chat_id), (self.total, None))
+        levels = [buckets.available(key, now) for buckets, key in checks]
+        wait = max(
+            buckets.wait_time(tokens)
+            for (buckets, _), tokens in zip(checks, levels)
+            if tokens < 1
+        ) if min(levels) < 1 else 0
+        if wait:
+            self.rejected += 1
+            return wait
+
+        for (buckets, key), tokens in zip(checks, levels):
+            buckets.consume(key, tokens, now)
+        self.allowed += 1
+        return 0
+
+    def should_notify(self, user_id, wait):
+        # Об отказе сообщаем пользователю один раз за период ожидания, а не на каждое сообщение
+        now = time.monotonic()
+        if self._notified.get(user_id, 0) > now:
+            return False
+        self._notified[user_id] = now + wait
+        return True
+
+    def sweep(self, now=None):
+        now = time.monotonic() if now is None else now
+        self._last_sweep = now
+        for buckets in (self.users, self.chats, self.total):
+            buckets.sweep(now)
+        self._notified = {key: until for key, until in self._notified.items() if until > now}
+
+    def stats(self):
+        return {
+            "allowed": self.allowed,
+            "rejected": self.rejected,
+            "user_buckets": len(self.users),
+            "chat_buckets": len(self.chats),
+        }
@@ -0,0 +1,277 @@
+# Устойчивость обращений к Gemini: повторы с экспоненциальной задержкой и джиттером
+# в пределах общего дедлайна, автомат (circuit breaker), который при череде сбоев
+# сразу отвечает ошибкой, не нагружая Gemini, и опциональный "хедж" — второй запрос,
+# если первый не ответил за время p95, чтобы срезать хвост задержек. У потока хедж
+# действует до первого чанка: остаётся поток, который начал отвечать первым.
+# Обёртка повторяет интерфейс GeminiBackend (generate/stream).
+import asyncio
+import functools
+import logging
+import random
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+
+@functools.lru_cache(maxsize=None)
+def transient_errors():
+    # Временные ошибки, которые имеет смысл повторить. api_core тянет за собой grpc,
+    # поэтому импортируется при первой ошибке, а не при старте бота
+    from google.api_core import exceptions as api_exceptions
+
+    return (
+        api_exceptions.TooManyRequests,
+        api_exceptions.ResourceExhausted,
+        api_exceptions.InternalServerError,
+        api_exceptions.BadGateway,
+        api_exceptions.ServiceUnavailable,
+        api_exceptions.GatewayTimeout,
+        api_exceptions.DeadlineExceeded,
+        asyncio.TimeoutError,
+        ConnectionError,
+    )
+
+
+class CircuitOpen(Exception):
+    pass
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold=5, recovery_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.probe_started = None
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.recovery_timeout:
+            return "half_open"
+        return "open"
+
+    def check(self):
+        # В полуоткрытом состоянии пропускается один пробный запрос: успех закроет автомат,
+        # сбой снова откроет его на recovery_timeout, остальные запросы до исхода пробы
+        # отклоняются. Проба без исхода (отменена или упала с не временной ошибкой)
+        # через recovery_timeout уступает место новой
+        state = self.state
+        if state == "half_open":
+            now = time.monotonic()
+            if self.probe_started is None or now - self.probe_started >= self.recovery_timeout:
+                self.probe_started = now
+                return
+        if state != "closed":
+            raise CircuitOpen("Gemini временно недоступен, попробуйте позже.")
+
+    def success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.probe_started = None
+
+    def failure(self):
+        self.failures += 1
+        if self.failures >= self.failure_threshold or self.state == "half_open":
+            if self.opened_at is None or self.state == "half_open":
+                logger.error(f"Gemini circuit opened after {self.failures} failures")
+            self.opened_at = time.monotonic()
+            self.probe_started = None
+
+
+class LatencyTracker:
+    def __init__(self, size=200):
+        self.samples = deque(maxlen=size)
+
+    def add(self, seconds):
+        self.samples.append(seconds)
+
+    def percentile(self, fraction, default):
+        if len(self.samples) < 20:
+            return default
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+class ResilientGemini:
+    def __init__(
+        self,
+        backend,
+        max_attempts=3,
+        base_delay=0.5,
+        max_delay=8.0,
+        deadline=60.0,
+        breaker=None,
+        hedge=False,
+        hedge_default_delay=5.0,
+    ):
+        self.backend = backend
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+        self.breaker = breaker or CircuitBreaker()
+        self.hedge = hedge
+        self.hedge_default_delay = hedge_default_delay
+        self.latency = LatencyTracker()
+        # Для потоков p95 считается по времени до первого чанка
+        self.first_chunk_latency = LatencyTracker()
+        self.retries = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    @property
+    def in_flight(self):
+        return self.backend.in_flight
+
+    def shutdown(self):
+        self.backend.shutdown()
+
+    def _backoff(self, attempt):
+        # "Full jitter": случайная задержка от 0 до экспоненциального потолка
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    async def _attempt(self, contents, kwargs):
+        started = time.monotonic()
+        result = await self.backend.generate(contents, **kwargs)
+        self.latency.add(time.monotonic() - started)
+        return result
+
+    async def _hedged(self, contents, kwargs):
+        # Второй запрос уходит, если первый не ответил за p95; берём первый успешный
+        # Отмена (wait_for по дедлайну) в любой момент не оставляет запросы без хозяина
+        delay = self.latency.percentile(0.95, self.hedge_default_delay)
+        pending = set()
+        error = None
+        try:
+            primary = asyncio.ensure_future(self._attempt(contents, kwargs))
+            pending = {primary}
+            done, pending = await asyncio.wait(pending, timeout=delay)
+            if done:
+                return primary.result()
+
+            self.hedges += 1
+            backup = asyncio.ensure_future(self._attempt(contents, kwargs))
+            pending.add(backup)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is backup:
+                            self.hedge_wins += 1
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def _open_stream(self, contents, kwargs):
+        # Поток и его первый текст (None — поток пустой)
+        started = time.monotonic()
+        chunks = self.backend.stream(contents, **kwargs)
+        try:
+            first = await chunks.__anext__()
+        except StopAsyncIteration:
+            return chunks, None
+        self.first_chunk_latency.add(time.monotonic() - started)
+        return chunks, first
+
+    async def _hedged_stream(self, contents, kwargs):
+        # Второй поток открывается, если первый не дал чанк за p95; проигравший закрывается
+        delay = self.first_chunk_latency.percentile(0.95, self.hedge_default_delay)
+        pending = set()
+        winner, error = None, None
+        try:
+            primary = asyncio.ensure_future(self._open_stream(contents, kwargs))
+            pending = {primary}
+            done, pending = await asyncio.wait(pending, timeout=delay)
+            if done:
+                return primary.result()
+
+            self.hedges += 1
+            backup = asyncio.ensure_future(self._open_stream(contents, kwargs))
+            pending.add(backup)
+            while pending and winner is None:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is not None:
+                        error = task.exception()
+                    elif winner is None:
+                        winner = task
+                    else:
+                        await task.result()[0].aclose()
+            if winner is None:
+                raise error
+            if winner is backup:
+                self.hedge_wins += 1
+            return winner.result()
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def generate(self, contents, **kwargs):
+        self.breaker.check()
+        deadline = time.monotonic() + self.deadline
+        attempt = 0
+        while True:
+            remaining = deadline - time.monotonic()
+            try:
+                call = self._hedged if self.hedge else self._attempt
+                result = await asyncio.wait_for(call(contents, kwargs), remaining)
+            except transient_errors() as e:
+                self.breaker.failure()
+                attempt += 1
+                delay = self._backoff(attempt)
+                if attempt >= self.max_attempts or time.monotonic() + delay >= deadline:
+                    raise
+                self.retries += 1
+                logger.warning(f"Gemini call failed ({type(e).__name__}), retry {attempt} in {delay:.1f}s")
+                await asyncio.sleep(delay)
+                self.breaker.check()
+                continue
+            self.breaker.success()
+            return result
+
+    async def stream(self, contents, **kwargs):
+        # Поток можно повторить только до первого чанка: отданный текст уже у пользователя
+        self.breaker.check()
+        deadline = time.monotonic() + self.deadline
+        attempt = 0
+        while True:
+            started = False
+            try:
+                opened = self._hedged_stream if self.hedge else self._open_stream
+                chunks, first = await opened(contents, kwargs)
+                try:
+                    if first is not None:
+                        started = True
+                        yield first
+                        async for text in chunks:
+                            yield text
+                finally:
+                    await chunks.aclose()
+                self.breaker.success()
+                return
+            except transient_errors() as e:
+                self.breaker.failure()
+                attempt += 1
+                delay = self._backoff(attempt)
+                if started or attempt >= self.max_attempts or time.monotonic() + delay >= deadline:
+                    raise
+                self.retries += 1
+                logger.warning(f"Gemini stream failed ({type(e).__name__}), retry {attempt} in {delay:.1f}s")
+                await asyncio.sleep(delay)
+                self.breaker.check()
+
+    def stats(self):
+        return {
+            "breaker": self.breaker.state,
+            "failures": self.breaker.failures,
+            "retries": self.retries,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "p95": self.latency.percentile(0.95, 0.0),
+        }
@@ -0,0 +1,145 @@
+# Кеш ответов на повторяющиеся вопросы.
+# Ключ — нормализованный вопрос + настройки генерации + модель + системный промт.
+# Память: LRU с TTL; опционально второй уровень на диске (SQLite).
+# Вопросы с историей диалога не кешируются: ответ зависит от контекста.
+import asyncio
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+_SPACES = re.compile(r"\s+")
+
+
+def normalize_query(query):
+    # "Что такое  Python?!" и "что такое python" — один и тот же вопрос
+    return _SPACES.sub(" ", query.lower()).strip(" ?!.,;:")
+
+
+def response_cache_key(query, generation_config, model_name, system_prompt):
+    payload = json.dumps(
+        [normalize_query(query), generation_config, model_name, system_prompt],
+        sort_keys=True,
+        ensure_ascii=False,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    def __init__(self, ttl=3600, max_entries=1024, disk_path=None, disk_max_entries=100_000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.disk_path = disk_path
+        self.disk_max_entries = disk_max_entries
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self._memory = OrderedDict()
+        self._connection = None
+        self._executor = None
+        self._disk_writes = 0
+        if disk_path:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="response-cache")
+
+    @staticmethod
+    def applies_to(history):
+        # Кешируем только вопросы без предыстории (одна реплика пользователя)
+        return len(history) <= 1
+
+    def key_for(self, query, history, generation_config, model_name, system_prompt):
+        # Ключ кеша или None, если ответ зависит от истории диалога (такие запросы считаются)
+        if not self.applies_to(history):
+            self.bypassed += 1
+            return None
+        return response_cache_key(query, generation_config, model_name, system_prompt)
+
+    async def get(self, key):
+        entry = self._memory.get(key)
+        now = time.time()
+        if entry is not None:
+            expires_at, text = entry
+            if expires_at > now:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return text
+            del self._memory[key]
+
+        if self._executor is not None:
+            row = await self._run(self._disk_get, key, now)
+            if row is not None:
+                expires_at, text = row
+                self._remember(key, expires_at, text)
+                self.hits += 1
+                return text
+
+        self.misses += 1
+        return None
+
+    async def set(self, key, text):
+        expires_at = time.time() + self.ttl
+        self._remember(key, expires_at, text)
+        if self._executor is not None:
+            await self._run(self._disk_set, key, expires_at, text)
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "bypassed": self.bypassed,
+            "entries": len(self._memory),
+        }
+
+    def _remember(self, key, expires_at, text):
+        self._memory[key] = (expires_at, text)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    async def _run(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, func, *args)
+
+    def _disk(self):
+        if self._connection is None:
+            directory = os.path.dirname(self.disk_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._connection = sqlite3.connect(self.disk_path, check_same_thread=False)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS responses "
+                "(key TEXT PRIMARY KEY, expires_at REAL NOT NULL, text TEXT NOT NULL)"
+            )
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS responses_by_expiry ON responses (expires_at)"
+            )
+        return self._connection
+
+    def _disk_get(self, key, now):
+        return self._disk().execute(
+            "SELECT expires_at, text FROM responses WHERE key = ? AND expires_at > ?",
+            (key, now),
+        ).fetchone()
+
+    def _disk_set(self, key, expires_at, text):
+        connection = self._disk()
+        with connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO responses (key, expires_at, text) VALUES (?, ?, ?)",
+                (key, expires_at, text),
+            )
+            self._disk_writes += 1
+            if self._disk_writes % 100:
+                return
+            # Раз в 100 записей: удаляем просроченные и лишние (самые старые по сроку)
+            connection.execute("DELETE FROM responses WHERE expires_at <= ?", (time.time(),))
+            connection.execute(
+                "DELETE FROM responses WHERE key IN (SELECT key FROM responses "
+                "ORDER BY expires_at DESC LIMIT -1 OFFSET ?)",
+                (self.disk_max_entries,),
+            )
@@ -0,0 +1,142 @@
+# Режим нескольких процессов: один процесс принимает апдейты (polling или вебхук)
+# и раздаёт их N рабочим процессам по хешу chat_id через каналы multiprocessing.
+# Все апдейты одного чата попадают в один процесс, поэтому порядок внутри чата
+# сохраняется, а разные чаты обрабатываются на всех ядрах.
+# Упавший рабочий процесс перезапускается и продолжает читать тот же канал,
+# так что ещё не прочитанные апдейты не теряются.
+import asyncio
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+
+from telegram import Update
+from telegram.ext import ApplicationBuilder, TypeHandler
+
+logger = logging.getLogger(__name__)
+
+
+def shard_for(chat_id, shards):
+    # Python: -7 % 4 == 1, отрицательные id групп распределяются так же ровно
+    return chat_id % shards if chat_id is not None else 0
+
+
+def _worker_main(index, reader, build_application):
+    # Номер процесса нужен, например, чтобы развести порты метрик
+    os.environ["SHARD_INDEX"] = str(index)
+    asyncio.run(_serve_channel(index, reader, build_application()))
+
+
+async def _serve_channel(index, reader, application):
+    # Жизненный цикл как у run_polling, только апдейты приходят из канала супервизора
+    await application.initialize()
+    if application.post_init:
+        await application.post_init(application)
+    await application.start()
+    logger.info(f"Worker {index} started (pid {os.getpid()})")
+
+    loop = asyncio.get_running_loop()
+    try:
+        while True:
+            data = await loop.run_in_executor(None, reader.recv)
+            if data is None:
+                break
+            await application.update_queue.put(Update.de_json(data, application.bot))
+    finally:
+        await application.stop()
+        await application.shutdown()
+        if application.post_shutdown:
+            await application.post_shutdown(application)
+
+
+class _Shard:
+    # Канал к одному рабочему процессу. В отличие от multiprocessing.Queue у Pipe
+    # нет межпроцессной блокировки на чтение, которую убитый процесс оставил бы занятой.
+    # Отправка идёт из отдельного потока, чтобы полный канал не блокировал event loop
+    def __init__(self, context):
+        self.reader, self.writer = context.Pipe(duplex=False)
+        self.outgoing = queue.SimpleQueue()
+        threading.Thread(target=self._pump, daemon=True).start()
+
+    def _pump(self):
+        while True:
+            item = self.outgoing.get()
+            self.writer.send(item)
+            if item is None:
+                break
+
+
+class Supervisor:
+    def __init__(self, build_application, workers, check_interval=1.0):
+        # build_application должна быть функцией уровня модуля: её передают в дочерний процесс
+        self.build_application = build_application
+        self.workers = workers
+        self.check_interval = check_interval
+        self.forwarded = 0
+        self.restarts = 0
+        self._context = multiprocessing.get_context("spawn")
+        self._shards = []
+        self._processes = []
+        self._watch_task = None
+        self._stopping = False
+
+    def _spawn(self, index):
+        process = self._context.Process(
+            target=_worker_main,
+            args=(index, self._shards[index].reader, self.build_application),
+            name=f"bot-worker-{index}",
+            daemon=True,
+        )
+        process.start()
+        return process
+
+    def start(self):
+        # Рабочие процессы делят общие лимиты (Telegram, Gemini) между собой
+        os.environ["SHARD_COUNT"] = str(self.workers)
+        self._shards = [_Shard(self._context) for _ in range(self.workers)]
+        self._processes = [self._spawn(index) for index in range(self.workers)]
+        self._watch_task = asyncio.create_task(self._watch())
+
+    async def _watch(self):
+        while not self._stopping:
+            await asyncio.sleep(self.check_interval)
+            for index, process in enumerate(self._processes):
+                if not process.is_alive() and not self._stopping:
+                    logger.error(
+                        f"Worker {index} exited with code {process.exitcode}, restarting"
+                    )
+                    self.restarts += 1
+                    self._processes[index] = self._spawn(index)
+
+    async def forward(self, update, context):
+        chat_id = update.effective_chat.id if update.effective_chat else None
+        self._shards[shard_for(chat_id, self.workers)].outgoing.put(update.to_dict())
+        self.forwarded += 1
+
+    async def stop(self, timeout=10):
+        self._stopping = True
+        if self._watch_task is not None:
+            self._watch_task.cancel()
+        for shard in self._shards:
+            shard.outgoing.put(None)
+        loop = asyncio.get_running_loop()
+        for process in self._processes:
+            await loop.run_in_executor(None, process.join, timeout)
+            if process.is_alive():
+                process.terminate()
+
+    def build_ingress(self, token, base_url=None):
+        # Приложение-приёмник: никаких хендлеров, только пересылка апдейтов в процессы
+        async def on_startup(application):
+            self.start()
+
+        async def on_shutdown(application):
+            await self.stop()
+
+        builder = ApplicationBuilder().token(token)
+        if base_url:
+            builder = builder.base_url(base_url)
+        application = builder.post_init(on_startup).post_shutdown(on_shutdown).build()
+        application.add_handler(TypeHandler(Update, self.forward))
+        return application
@@ -0,0 +1,87 @@
+# Объединение одинаковых одновременных запросов к Gemini (single-flight).
+# Пока генерация для ключа выполняется, повторные запросы с тем же ключом
+# не идут в API, а ждут результат первого.
+import asyncio
+import hashlib
+import json
+
+
+def request_key(contents, generation_config, model_name):
+    payload = json.dumps(
+        [contents, generation_config, model_name],
+        sort_keys=True,
+        ensure_ascii=False,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LeaderCancelled(Exception):
+    pass
+
+
+class SingleFlight:
+    def __init__(self):
+        self.calls = 0
+        self.coalesced = 0
+        self._in_flight = {}
+
+    def stats(self):
+        return {"calls": self.calls, "coalesced": self.coalesced, "in_flight": len(self._in_flight)}
+
+    def _start(self, key):
+        self.calls += 1
+        future = asyncio.get_running_loop().create_future()
+        # Исключение не должно попасть в лог "never retrieved", если ждущих не было
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._in_flight[key] = future
+        return future
+
+    @staticmethod
+    def _fail(future, error):
+        if future.done():
+            return
+        if isinstance(error, Exception):
+            future.set_exception(error)
+        else:
+            # Отмена/закрытие генератора у первого запроса — ждущие получают обычную ошибку
+            future.set_exception(LeaderCancelled("Coalesced request was cancelled"))
+
+    async def do(self, key, func):
+        future = self._in_flight.get(key)
+        if future is not None:
+            self.coalesced += 1
+            return await asyncio.shield(future)
+
+        future = self._start(key)
+        try:
+            result = await func()
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            self._fail(future, e)
+            raise
+        finally:
+            del self._in_flight[key]
+
+    async def stream(self, key, make_iterator):
+        # Первый запрос получает чанки по мере генерации,
+        # присоединившиеся — весь текст одним куском в конце
+        future = self._in_flight.get(key)
+        if future is not None:
+            self.coalesced += 1
+            yield await asyncio.shield(future)
+            return
+
+        future = self._start(key)
+        parts = []
+        try:
+            async for chunk in make_iterator():
+                parts.append(chunk)
+                yield chunk
+            future.set_result("".join(parts))
+        except BaseException as e:
+            self._fail(future, e)
+            raise
+        finally:
+            del self._in_flight[key]
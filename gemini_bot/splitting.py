@@ -0,0 +1,73 @@
+# Разбиение длинного ответа на сообщения Telegram (лимит 4096 символов).
+# Режем по абзацам, затем по строкам, предложениям и пробелам.
+# Если разрез попал внутрь блока кода, блок закрывается в этом куске
+# и открывается заново (с тем же языком) в следующем.
+import re
+
+TELEGRAM_MESSAGE_LIMIT = 4096
+
+_FENCE = re.compile(r"^[ \t]*```([\w+#-]*)", re.M)
+_SENTENCE_END = re.compile(r"[.!?…](?:\s)")
+
+
+def telegram_length(text):
+    # Telegram считает длину в UTF-16 (эмодзи занимают 2 единицы)
+    return len(text.encode("utf-16-le")) // 2
+
+
+def _cut_point(text, limit):
+    window = text[:limit]
+    floor = limit // 2
+    for separator in ("\n\n", "\n"):
+        index = window.rfind(separator, floor)
+        if index != -1:
+            return index + len(separator)
+    sentence_ends = [match.end() for match in _SENTENCE_END.finditer(window, floor)]
+    if sentence_ends:
+        return sentence_ends[-1]
+    index = window.rfind(" ", floor)
+    if index != -1:
+        return index + 1
+    return limit
+
+
+def _open_fence(text):
+    # Язык незакрытого блока кода в конце text ("" — без языка) или None
+    language = None
+    for match in _FENCE.finditer(text):
+        language = match.group(1) if language is None else None
+    return language
+
+
+def split_text(text, limit=TELEGRAM_MESSAGE_LIMIT):
+    # limit с запасом на закрывающие/открывающие ``` при разрезе блока кода
+    limit = max(limit - 16, 256)
+    chunks = []
+    while len(text) > limit:
+        cut = _cut_point(text, limit)
+        chunk, text = text[:cut], text[cut:]
+        language = _open_fence(chunk)
+        if language is not None:
+            chunk = chunk.rstrip("\n") + "\n```"
+            text = f"```{language}\n" + text
+        if chunk.strip():
+            chunks.append(chunk.strip("\n"))
+    if text.strip():
+        chunks.append(text.strip("\n"))
+    return chunks
+
+
+def split_reply(text, render=None, limit=TELEGRAM_MESSAGE_LIMIT, source_limit=None):
+    # [(исходный кусок, отформатированный кусок)], каждый в пределах limit
+    # после форматирования (экранирование и теги удлиняют текст)
+    source_limit = source_limit or limit
+    parts = []
+    for chunk in split_text(text, source_limit):
+        rendered = render(chunk) if render is not None else chunk
+        size = telegram_length(rendered)
+        if size > limit and source_limit > 256:
+            smaller = int(source_limit * limit / size * 0.9)
+            parts.extend(split_reply(chunk, render, limit, smaller))
+        else:
+            parts.append((chunk, rendered))
+    return parts
@@ -0,0 +1,110 @@
+# Потоковый вывод ответа: сообщение "думаю..." постепенно редактируется
+# по мере прихода текста от Gemini.
+# Telegram ограничивает частоту правок (в группах ~20 сообщений/правок в минуту),
+# поэтому правки идут не чаще edit_interval и только при заметном приросте текста.
+# Вместо message_id можно передать placeholder — future отправки "думаю...":
+# генерация не ждёт его, промежуточные правки начинаются, когда он отправлен.
+import asyncio
+import logging
+import time
+
+from telegram.constants import ParseMode
+from telegram.error import BadRequest, RetryAfter
+
+from .delivery import send_reply
+from .outbox import PLACEHOLDER
+from .splitting import TELEGRAM_MESSAGE_LIMIT
+
+logger = logging.getLogger(__name__)
+
+
+async def stream_to_message(
+    bot,
+    chat_id,
+    message_id,
+    chunks,
+    edit_interval=2.0,
+    min_delta=40,
+    parse_mode=ParseMode.HTML,
+    render=None,
+    message_thread_id=None,
+    outbox=None,
+    placeholder=None,
+):
+    text = ""
+    shown = ""
+    next_edit_at = time.monotonic()
+
+    async for chunk in chunks:
+        text += chunk
+        now = time.monotonic()
+        if now < next_edit_at or len(text) - len(shown) < min_delta:
+            continue
+        if placeholder is not None and placeholder.done():
+            message_id = _sent_message_id(placeholder)
+            placeholder = None
+        if message_id is None:
+            # "думаю..." ещё в очереди (или не отправился) — править пока нечего
+            continue
+        # Промежуточные правки без разметки: незакрытый Markdown Telegram отклонит
+        # Длинный ответ целиком будет показан в финале, пока — только начало
+        preview = text[:TELEGRAM_MESSAGE_LIMIT]
+        if preview == shown:
+            continue
+        if outbox is not None:
+            # Промежуточная правка уходит в очередь с низким приоритетом и не задерживает
+            # чтение потока; более свежая правка заменит ещё не отправленную
+            future = outbox.submit(
+                chat_id,
+                lambda preview=preview: bot.edit_message_text(
+                    preview, chat_id=chat_id, message_id=message_id
+                ),
+                priority=PLACEHOLDER,
+                coalesce_key=("edit", chat_id, message_id),
+            )
+            future.add_done_callback(_log_edit_error)
+            shown = preview
+            next_edit_at = now + edit_interval
+            continue
+        try:
+            await bot.edit_message_text(preview, chat_id=chat_id, message_id=message_id)
+            shown = preview
+            next_edit_at = now + edit_interval
+        except RetryAfter as e:
+            logger.warning(f"Edit rate limit hit, waiting {e.retry_after}s")
+            next_edit_at = now + e.retry_after
+        except BadRequest as e:
+            # "Message is not modified" и подобные ошибки не мешают продолжить
+            logger.debug(f"Interim edit skipped: {e}")
+            next_edit_at = now + edit_interval
+
+    if placeholder is not None:
+        await asyncio.wait([placeholder])
+        message_id = _sent_message_id(placeholder)
+    if not text:
+        return text
+
+    # Финальный текст с разметкой; длинный ответ продолжается следующими сообщениями
+    await send_reply(
+        bot,
+        chat_id,
+        text,
+        render=render,
+        parse_mode=parse_mode,
+        message_thread_id=message_thread_id,
+        edit_message_id=message_id,
+        outbox=outbox,
+    )
+    return text
+
+
+def _sent_message_id(placeholder):
+    # Если "думаю..." не отправился, ответ уйдёт новым сообщением
+    if placeholder.cancelled() or placeholder.exception() is not None:
+        return None
+    return placeholder.result().message_id
+
+
+def _log_edit_error(future):
+    if not future.cancelled() and future.exception() is not None:
+        logger.debug(f"Interim edit skipped: {future.exception()}")
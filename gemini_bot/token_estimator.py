@@ -0,0 +1,64 @@
+# Локальная оценка числа токенов без обращения к count_tokens.
+# Текст режется на слова, числа и знаки препинания примерно так же, как это делает
+# токенизатор Gemini; латинские слова дешевле кириллических. Сырая оценка кешируется
+# по тексту (реплики истории не меняются, поэтому каждая считается один раз),
+# а поправочный коэффициент подстраивается по usage_metadata настоящих ответов.
+import functools
+import math
+import re
+
+# Слово (любые буквы), до трёх цифр, любой другой непробельный символ
+PIECE = re.compile(r"[^\W\d_]+|\d{1,3}|\S")
+
+# Служебные токены на каждую реплику (роль, разделители)
+TURN_OVERHEAD = 4
+
+
+@functools.lru_cache(maxsize=8192)
+def raw_tokens(text):
+    total = 0
+    for piece in PIECE.findall(text):
+        if piece[0].isalpha():
+            # Латиница: ~6 символов на токен, остальные алфавиты дробятся мельче
+            total += 1 + len(piece) // (6 if piece.isascii() else 4)
+        else:
+            total += 1
+    return total
+
+
+class TokenEstimator:
+    def __init__(self, ratio=1.0, alpha=0.1, min_ratio=0.25, max_ratio=4.0):
+        self.ratio = ratio
+        self.alpha = alpha
+        self.min_ratio = min_ratio
+        self.max_ratio = max_ratio
+        self.samples = 0
+        self.last_error = 0.0
+
+    def scale(self, raw):
+        return math.ceil(raw * self.ratio)
+
+    def count(self, text):
+        return self.scale(raw_tokens(text))
+
+    def contents_raw(self, contents, system_instruction=None):
+        # Сырая оценка запроса в формате contents (см. ConversationHistory.to_contents)
+        total = raw_tokens(system_instruction) if system_instruction else 0
+        for content in contents:
+            total += TURN_OVERHEAD
+            for part in content["parts"]:
+                total += raw_tokens(part)
+        return total
+
+    def calibrate(self, raw, actual):
+        # Коэффициент = скользящее среднее отношения настоящего числа токенов к оценке
+        if raw <= 0 or actual <= 0:
+            return
+        self.samples += 1
+        self.last_error = (self.scale(raw) - actual) / actual
+        ratio = self.ratio + self.alpha * (actual / raw - self.ratio)
+        self.ratio = min(self.max_ratio, max(self.min_ratio, ratio))
+
+
+# Общий экземпляр: история и проверка бюджета запроса используют одну калибровку
+estimator = TokenEstimator()
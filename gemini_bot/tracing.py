@@ -0,0 +1,81 @@
+# Трассировка обработки апдейта: каждая стадия handle_message — отдельный span
+# с временем начала и длительностью. Текущая трасса хранится в contextvar, поэтому
+# span можно открыть в любом модуле, не передавая трассу аргументами;
+# вне трассы span ничего не стоит. Готовые трассы (сэмпл и все медленные)
+# пишутся как JSON-строки через AuditLog, последние держатся в памяти.
+import contextlib
+import contextvars
+import random
+import time
+from collections import deque
+
+_current = contextvars.ContextVar("trace", default=None)
+
+
+class Trace:
+    __slots__ = ("update_id", "chat_id", "started_at", "started", "spans")
+
+    def __init__(self, update_id, chat_id=None):
+        self.update_id = update_id
+        self.chat_id = chat_id
+        self.started_at = time.time()
+        self.started = time.perf_counter()
+        self.spans = []
+
+    def to_dict(self):
+        return {
+            "update_id": self.update_id,
+            "chat_id": self.chat_id,
+            "started_at": round(self.started_at, 3),
+            "ms": round((time.perf_counter() - self.started) * 1000, 2),
+            "spans": self.spans,
+        }
+
+
+@contextlib.contextmanager
+def span(name, **attrs):
+    trace = _current.get()
+    if trace is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        finished = time.perf_counter()
+        record = {
+            "name": name,
+            "start_ms": round((started - trace.started) * 1000, 2),
+            "ms": round((finished - started) * 1000, 2),
+        }
+        if attrs:
+            record.update(attrs)
+        trace.spans.append(record)
+
+
+class Tracer:
+    def __init__(self, sink=None, sample_rate=0.01, slow_seconds=10.0, keep=100):
+        # sink — AuditLog (или любой объект с record(**fields)) для выгрузки трасс
+        self.sink = sink
+        self.sample_rate = sample_rate
+        self.slow_seconds = slow_seconds
+        self.recent = deque(maxlen=keep)
+
+    @contextlib.contextmanager
+    def trace(self, update_id, chat_id=None):
+        trace = Trace(update_id, chat_id)
+        token = _current.set(trace)
+        try:
+            yield trace
+        finally:
+            _current.reset(token)
+            self._finish(trace)
+
+    def _finish(self, trace):
+        seconds = time.perf_counter() - trace.started
+        if seconds < self.slow_seconds and random.random() >= self.sample_rate:
+            return
+        data = trace.to_dict()
+        self.recent.append(data)
+        if self.sink is not None:
+            self.sink.record(**data)
@@ -0,0 +1,35 @@
+# Варианты бота, которые раньше были отдельными main0–main5.py и 3main.py.
+# Вариант — это только значения переменных окружения по умолчанию: явно заданная
+# переменная окружения важнее варианта. Применяются до импорта bot.py.
+import os
+
+# Старые простые боты: одна быстрая модель, без персоны, истории и потокового вывода
+_SIMPLE = {
+    "GEMINI_MODELS": "gemini-1.5-flash",
+    "PERSONA": "0",
+    "HISTORY_TOKEN_BUDGET": "0",
+    "GEMINI_STREAMING": "0",
+}
+
+VARIANTS = {
+    # Основной бот: персона, история диалога, потоковые ответы, две группы
+    "main": {},
+    # То же с коротким приветствием /start
+    "main5": {"START_TEXT": "short"},
+    # Без персоны и истории, только в своих группах
+    "main4": dict(_SIMPLE, START_TEXT="short"),
+    # Обращения по @упоминанию или ответом в любом чате
+    "main1": dict(_SIMPLE, ALLOWED_CHAT_IDS="*", START_TEXT="simple"),
+    "main2": dict(_SIMPLE, ALLOWED_CHAT_IDS="*", START_TEXT="simple"),
+    "3main": dict(_SIMPLE, ALLOWED_CHAT_IDS="*", START_TEXT="simple"),
+    # Отвечает на любое текстовое сообщение в любом чате
+    "main0": dict(_SIMPLE, ALLOWED_CHAT_IDS="*", ANSWER_ALL="1", START_TEXT="plain"),
+}
+
+
+def apply_variant(name):
+    if name not in VARIANTS:
+        raise ValueError(f"Unknown variant {name!r}, expected one of: {', '.join(VARIANTS)}")
+    for key, value in VARIANTS[name].items():
+        os.environ.setdefault(key, value)
+    os.environ["BOT_VARIANT"] = name
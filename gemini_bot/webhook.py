@@ -0,0 +1,71 @@
+# Приём апдейтов через вебхук на встроенном aiohttp-сервере (альтернатива run_polling).
+# Telegram получает ответ 200 сразу после постановки апдейта в очередь приложения,
+# обработка идёт дальше в фоне. Запросы без верного секретного токена отклоняются.
+import asyncio
+import hmac
+import json
+import logging
+
+from aiohttp import web
+from telegram import Update
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+def build_webhook_app(application, path="/telegram", secret_token=None):
+    async def receive(request):
+        if secret_token is not None:
+            received = request.headers.get(SECRET_HEADER, "")
+            if not hmac.compare_digest(received, secret_token):
+                return web.Response(status=403)
+        try:
+            data = json.loads(await request.read())
+            update = Update.de_json(data, application.bot)
+        except Exception as e:
+            logger.warning(f"Malformed webhook update: {str(e)}")
+            return web.Response(status=400)
+        application.update_queue.put_nowait(update)
+        return web.Response()
+
+    app = web.Application()
+    app.router.add_post(path, receive)
+    return app
+
+
+async def run_webhook(
+    application,
+    url,
+    listen="0.0.0.0",
+    port=8080,
+    path="/telegram",
+    secret_token=None,
+    allowed_updates=None,
+    drop_pending_updates=True,
+):
+    # Тот же жизненный цикл, что и у run_polling: initialize -> post_init -> start
+    await application.initialize()
+    if application.post_init:
+        await application.post_init(application)
+    await application.start()
+
+    runner = web.AppRunner(build_webhook_app(application, path, secret_token))
+    await runner.setup()
+    await web.TCPSite(runner, listen, port).start()
+    await application.bot.set_webhook(
+        url=url.rstrip("/") + path,
+        allowed_updates=allowed_updates,
+        drop_pending_updates=drop_pending_updates,
+        secret_token=secret_token,
+    )
+    logger.info(f"Webhook listening on {listen}:{port}{path}")
+
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+        await application.stop()
+        await application.shutdown()
+        if application.post_shutdown:
+            await application.post_shutdown(application)